@@ -0,0 +1,38 @@
+import time, logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from session.producer import ProducerUnavailable
+from games.outbox import relay_batch
+
+MAX_RETRY_DELAY = 30
+
+class Command(BaseCommand):
+    help = "Run <relay_outbox> to publish the games outbox (create_game messages) to Redis."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Messages published per round trip (OUTBOX_BATCH_SIZE).")
+        parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit.")
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs["batch_size"] or settings.OUTBOX_BATCH_SIZE
+        delay = settings.OUTBOX_POLL_INTERVAL
+        logging.info("UserSession: Starting outbox relay...")
+        while True:
+            close_old_connections()
+            try:
+                published = relay_batch(batch_size)
+            except ProducerUnavailable as e:
+                if kwargs["once"]:
+                    raise CommandError(f"Redis unavailable | {e}")
+                logging.error(f"Error | relay_outbox | Redis unavailable, retrying in {delay}s | {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            delay = settings.OUTBOX_POLL_INTERVAL
+            if published == batch_size:
+                continue
+            if kwargs["once"]:
+                return
+            time.sleep(settings.OUTBOX_POLL_INTERVAL)
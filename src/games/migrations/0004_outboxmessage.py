@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("games", "0003_delete_gamemodel"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxMessage",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("queue", models.CharField(max_length=100)),
+                ("payload", models.JSONField()),
+                ("createdAt", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import models
+
+class OutboxMessage(models.Model):
+    """
+    A message for another service, written in the same transaction as the rows it
+    describes. `python manage.py relay_outbox` pushes pending rows to their Redis
+    queue and deletes them, so a message exists if and only if its transaction
+    committed, and stays here until Redis has taken it.
+    """
+    queue = models.CharField(max_length=100)
+    payload = models.JSONField()
+    createdAt = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.queue} #{self.id}"
@@ -0,0 +1,31 @@
+import logging
+
+from django.db import transaction
+from session.producer import producer
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+def enqueue(queue, message):
+    """Stores `message` for `queue`; call it inside the transaction that writes the rows it talks about."""
+    return OutboxMessage.objects.create(queue=queue, payload=message)
+
+def enqueue_many(queue, messages):
+    """Same as `enqueue` for several messages, in one INSERT; the relay publishes them in one round trip."""
+    return OutboxMessage.objects.bulk_create([OutboxMessage(queue=queue, payload=message) for message in messages])
+
+def relay_batch(batch_size=100):
+    """
+    Pushes up to `batch_size` pending messages, oldest first, in one pipelined round
+    trip and deletes them. Rows stay locked (SKIP LOCKED for other relays) until the
+    push is done; if it fails they are left for the next run. A crash between the
+    push and the commit sends the batch again, so delivery is at least once.
+    """
+    with transaction.atomic():
+        messages = list(OutboxMessage.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size])
+        if not messages:
+            return 0
+        producer.push_many((message.queue, message.payload) for message in messages)
+        OutboxMessage.objects.filter(id__in=[message.id for message in messages]).delete()
+    logger.info(f"relay_batch | published {len(messages)} outbox messages")
+    return len(messages)
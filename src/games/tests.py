@@ -1,3 +1,123 @@
-from django.test import TestCase
+from unittest import mock
+from datetime import timedelta
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rooms.models import Room, Match
+from players.models import Player
+from session.producer import RedisProducer, ProducerUnavailable
+from .models import OutboxMessage
+from rooms.utils import createTournamentMatches
+from .outbox import relay_batch
 
-# Create your tests here.
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class GameViewTestCase(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(name="Match Room", maxAmountOfPlayers=2, amountOfPlayers=2, type=0, createdBy="Owner")
+        self.owner = Player.objects.create(name="Owner", roomId=self.room, roomCode=self.room.code, profileColor=1)
+        Player.objects.create(name="Guest", roomId=self.room, roomCode=self.room.code, profileColor=2)
+
+    def new_game(self):
+        return self.client.post(f"/api/v1/user-session/games/{self.room.code}/new-game/", headers={"X-User-Id": self.owner.id})
+
+    def test_new_game_writes_create_game_to_outbox(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.new_game()
+
+        self.assertEqual(response.status_code, 201)
+        match = Match.objects.get(room=self.room)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.queue, settings.GAME_CREATE_QUEUE)
+        self.assertEqual(message.payload["matchId"], match.id)
+        self.assertEqual(len(message.payload["players"]), 2)
+
+    def test_new_game_query_budget_does_not_grow_with_room_size(self):
+        # room, roster, room status, match, match players, outbox + the test's savepoint and release
+        with self.assertNumQueries(8):
+            self.assertEqual(self.new_game().status_code, 201)
+
+        self.room = Room.objects.create(name="Big Room", maxAmountOfPlayers=4, amountOfPlayers=4, type=0, createdBy="Owner")
+        self.owner = Player.objects.create(name="Owner", roomId=self.room, roomCode=self.room.code, profileColor=1)
+        for i in range(3):
+            Player.objects.create(name=f"Guest {i}", roomId=self.room, roomCode=self.room.code, profileColor=i + 2)
+        with self.assertNumQueries(8):
+            self.assertEqual(self.new_game().status_code, 201)
+        self.assertEqual(Match.objects.get(room=self.room).players_in_match.count(), 4)
+
+    def test_relay_publishes_and_deletes_outbox(self):
+        self.new_game()
+        with mock.patch("games.outbox.producer") as producer:
+            self.assertEqual(relay_batch(), 1)
+
+        (queue, message), = producer.push_many.call_args.args[0]
+        self.assertEqual(queue, settings.GAME_CREATE_QUEUE)
+        self.assertEqual(message["type"], "create_game")
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_relay_keeps_outbox_when_redis_is_down(self):
+        self.new_game()
+        # Nothing listens on port 1, so the push fails as soon as it tries to connect.
+        with mock.patch("games.outbox.producer", RedisProducer(host="127.0.0.1", port=1)):
+            with self.assertRaises(ProducerUnavailable):
+                relay_batch()
+
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+class StageGamesViewTestCase(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(name="Tournament Room", maxAmountOfPlayers=8, amountOfPlayers=8, type=1)
+        self.players = [
+            Player.objects.create(name=f"Player {i}", roomId=self.room, roomCode=self.room.code, bracketsPosition=i)
+            for i in range(1, 9)
+        ]
+        self.room.createdBy = self.players[0].id
+        self.room.save()
+        createTournamentMatches(self.room)
+
+    def start_stage(self, stage, user_id):
+        return self.client.post(f"/api/v1/user-session/games/{self.room.code}/stages/{stage}/start/", headers={"X-User-Id": user_id})
+
+    def test_start_stage_queues_every_filled_match(self):
+        # room, owner, rosters + savepoint, claim, mark, room status, outbox, release
+        with self.assertNumQueries(9):
+            response = self.start_stage(1, self.players[0].id)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([match["status"] for match in response.json()["matches"]], ["queued"] * 4)
+        messages = OutboxMessage.objects.order_by("id")
+        self.assertEqual(
+            [message.payload["matchId"] for message in messages],
+            list(Match.objects.filter(room=self.room, stage=1).order_by("position").values_list("id", flat=True)),
+        )
+
+    def test_start_stage_is_owner_only(self):
+        self.assertEqual(self.start_stage(1, self.players[1].id).status_code, 403)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_repeated_start_queues_each_match_once(self):
+        self.assertEqual(self.start_stage(1, self.players[0].id).status_code, 201)
+        response = self.start_stage(1, self.players[0].id)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([match["status"] for match in response.json()["matches"]], ["creating"] * 4)
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+
+    def test_stale_request_is_queued_again(self):
+        self.start_stage(1, self.players[0].id)
+        Match.objects.filter(room=self.room, stage=1, position=1).update(
+            gameRequestedAt=timezone.now() - timedelta(seconds=settings.GAME_CREATE_TIMEOUT + 1)
+        )
+        response = self.start_stage(1, self.players[0].id)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([match["status"] for match in response.json()["matches"]], ["queued"] + ["creating"] * 3)
+        self.assertEqual(OutboxMessage.objects.count(), 5)
+
+    def test_reports_real_match_state(self):
+        for position, fields in ((1, {"status": 3}), (2, {"status": 2}), (3, {"status": 1, "gameId": "game"})):
+            Match.objects.filter(room=self.room, stage=1, position=position).update(**fields)
+        response = self.start_stage(1, self.players[0].id)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([match["status"] for match in response.json()["matches"]], ["finished", "in-progress", "game-created", "queued"])
+        self.assertEqual(OutboxMessage.objects.count(), 1)
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import GameView, TournamentGameView
+from .views import GameView, TournamentGameView, StageGamesView
 
 urlpatterns = [
     path('<str:room_code>/new-game/', GameView.as_view(), name='new-game'),
     path('<str:room_code>/new-tournament-game/', TournamentGameView.as_view(), name='new-game'),
+    path('<str:room_code>/stages/<int:stage>/start/', StageGamesView.as_view(), name='start-stage'),
 ]
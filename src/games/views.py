@@ -1,8 +1,13 @@
-import redis
 import json
 import logging
 
-from django.http import HttpResponse
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
 from django.views import View
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
@@ -10,22 +15,31 @@ from asgiref.sync import async_to_sync
 from rooms.models import Room, Match
 from rooms.models import RoomStatus, roomTypes
 from players.models import Player, MatchPlayer
+from rooms.lobby import invalidate_lobby_on_commit
+from rooms.versions import bump_room_version_on_commit
+from rooms.status import publish_room_status_on_commit
+from .outbox import enqueue, enqueue_many
 
 logger = logging.getLogger(__name__)
 
-redis_client = redis.Redis(host='redis', port=6379, db=0, decode_responses=True)
-
 class GameView(View):
     def post(self, request, room_code):
         user_id = request.headers.get('X-User-Id')
         if user_id is None or not room_code or not user_id:
             return HttpResponse(f"User ID not found", status=400)
 
+        return self.create_game(room_code, user_id)
+
+    def create_game(self, room_code, user_id):
+        """Runs in a fixed number of queries whatever the room size: the roster is loaded once and reused."""
         room = Room.objects.filter(code=room_code).first()
-        player = Player.objects.filter(id=user_id).first()
-        if room is None or player is None:
+        if room is None:
             return HttpResponse(f"Room {room_code} or player {user_id} not found", status=404)
-        if room.players.count() < 2:
+        players = list(room.players.all())
+        player = next((p for p in players if p.id == user_id), None) or Player.objects.filter(id=user_id).first()
+        if player is None:
+            return HttpResponse(f"Room {room_code} or player {user_id} not found", status=404)
+        if len(players) < 2:
             return HttpResponse(f"Minimal amount of players {2}", status=403)
         if room.createdBy != player.name:
             return HttpResponse(f"User {user_id} is not the owner of room {room_code}", status=403)
@@ -34,62 +48,48 @@ class GameView(View):
         if room.amountOfPlayers != room.maxAmountOfPlayers and room.type != roomTypes.SINGLE_PLAYER.value:
             return HttpResponse(f"Room {room_code} is not full", status=403)
 
-        room.status = RoomStatus.CREATING_GAME
-        room.save()
-
-        isSinglePlayer = False
-        if (room.amountOfPlayers == 1):
-            isSinglePlayer = True
-
-        match = Match.objects.create(
-            room=room,
-            status=0
-        )
-        match.save()
-        for player in room.players.all():
-            MatchPlayer.objects.create(
-                match=match,
-                player=player,
-                position=0
-            )
-
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"room_{room_code}",
-            {
+        isSinglePlayer = room.amountOfPlayers == 1
+
+        with transaction.atomic():
+            Room.objects.filter(id=room.id).update(status=RoomStatus.CREATING_GAME.value, updatedAt=timezone.now())
+            invalidate_lobby_on_commit()
+            bump_room_version_on_commit(room.code)
+            publish_room_status_on_commit(room.code, RoomStatus.CREATING_GAME.value)
+            match = Match.objects.create(room=room, status=0)
+            MatchPlayer.objects.bulk_create([MatchPlayer(match=match, player=player, position=0) for player in players])
+
+            message = {
+                "type": "create_game",
+                "roomId": room.id,
+                "roomType": room.type,
+                "matchId": match.id,
+                "isSinglePlayer": isSinglePlayer,
+                "stage": room.stage,
+                "ownerId": user_id,
+                "players": [
+                    {
+                        "id": player.id,
+                        "name": player.name,
+                        "color": player.profileColor,
+                    }
+                    for player in players
+                ]
+            }
+            enqueue(settings.GAME_CREATE_QUEUE, message)
+
+            sync_match = {
                 "type": "sync.match",
                 "matches": [
                     {
                         "id": match.id,
-                        "players": [
-                            {"id": player.id}
-                            for player in room.players.all()
-                        ]
+                        "players": [{"id": player.id} for player in players]
                     }
                 ]
             }
-        )
-
-        message = {
-            "type": "create_game",
-            "roomId": room.id,
-            "roomType": room.type,
-            "matchId": match.id,
-            "isSinglePlayer": isSinglePlayer,
-            "stage": room.stage,
-            "ownerId": user_id,
-            "players": [
-                {
-                    "id": player.id,
-                    "name": player.name,
-                    "color": player.profileColor,
-                }
-                for player in room.players.all()
-            ]
-        }
+            channel_layer = get_channel_layer()
+            transaction.on_commit(lambda: async_to_sync(channel_layer.group_send)(f"room_{room_code}", sync_match))
 
         logger.info(f"{GameView.__name__} | ENVIANDO MSG {json.dumps(message)}")
-        redis_client.rpush("create-game-queue", json.dumps(message))
         return HttpResponse(f"Game created for room {room_code}", status=201)
 
 class TournamentGameView(View):
@@ -98,6 +98,9 @@ class TournamentGameView(View):
         if user_id is None or not room_code or not user_id:
             return HttpResponse(f"User ID not found", status=400)
 
+        return self.create_game(room_code, user_id)
+
+    def create_game(self, room_code, user_id):
         room = Room.objects.filter(code=room_code).first()
         if room is None:
             return HttpResponse(f"Room {room_code} not found", status=400)
@@ -108,44 +111,142 @@ class TournamentGameView(View):
         if room.amountOfPlayers != room.maxAmountOfPlayers:
             return HttpResponse(f"Room {room_code} is not full", status=403)
 
-        room.status = RoomStatus.CREATING_GAME
-        room.save()
-
         try:
-            player_one = Player.objects.filter(id=user_id).first()
-            if player_one is None:
-                return HttpResponse(f"Player {user_id} not found", status=400)
-            matchPlayer = MatchPlayer.objects.filter(player=player_one, match__stage=room.stage).first()
-            if (matchPlayer is None):
-                return HttpResponse(f"you lost!", status=401)
-            match = matchPlayer.match
-            secondMatchPlayer = MatchPlayer.objects.filter(match=match).exclude(player=player_one).first()
-            player_two = secondMatchPlayer.player
+            with transaction.atomic():
+                room.status = RoomStatus.CREATING_GAME
+                room.save()
+
+                player_one = Player.objects.filter(id=user_id).first()
+                if player_one is None:
+                    return HttpResponse(f"Player {user_id} not found", status=400)
+                matchPlayer = MatchPlayer.objects.filter(player=player_one, match__stage=room.stage).first()
+                if (matchPlayer is None):
+                    return HttpResponse(f"you lost!", status=401)
+                match = matchPlayer.match
+                secondMatchPlayer = MatchPlayer.objects.filter(match=match).exclude(player=player_one).first()
+                player_two = secondMatchPlayer.player
+
+                message = {
+                    "type": "create_game",
+                    "roomId": room.id,
+                    "roomType": room.type,
+                    "matchId": match.id,
+                    "isSinglePlayer": False,
+                    "stage": room.stage,
+                    "ownerId": user_id,
+                    "players": [
+                        {
+                            "id": player_one.id,
+                            "name": player_one.name,
+                            "color": player_one.profileColor,
+                        },
+                        {
+                            "id": player_two.id,
+                            "name": player_two.name,
+                            "color": player_two.profileColor,
+                        }
+                    ]
+                }
+                enqueue(settings.GAME_CREATE_QUEUE, message)
 
-            message = {
-                "type": "create_game",
-                "roomId": room.id,
-                "roomType": room.type,
-                "matchId": match.id,
-                "isSinglePlayer": False,
-                "stage": room.stage,
-                "ownerId": user_id,
-                "players": [
-                    {
-                        "id": player_one.id,
-                        "name": player_one.name,
-                        "color": player_one.profileColor,
-                    },
-                    {
-                        "id": player_two.id,
-                        "name": player_two.name,
-                        "color": player_two.profileColor,
-                    }
-                ]
-            }
             logger.info(f"{TournamentGameView.__name__} | ENVIANDO MSG {json.dumps(message)}")
-            redis_client.rpush("create-game-queue", json.dumps(message))
             return HttpResponse(f"Game created for room {room_code}", status=201)
         except Exception as e:
             logger.error(f"Error creating game for room {room_code}: {str(e)}")
             return HttpResponse(f"Error creating game for room {room_code}", status=500)
+
+class StageGamesView(View):
+    """Starts every filled match of a tournament stage at once, instead of one TournamentGameView call per pair."""
+    def post(self, request, room_code, stage):
+        user_id = request.headers.get('X-User-Id')
+        if not user_id or not room_code:
+            return JsonResponse({'errorCode': '400', 'message': 'Bad request'}, status=400)
+
+        return self.create_games(room_code, stage, user_id)
+
+    def create_games(self, room_code, stage, user_id):
+        room = Room.objects.filter(code=room_code).first()
+        if room is None:
+            return JsonResponse({'errorCode': '404', 'message': 'Room not found'}, status=404)
+        if room.type != roomTypes.TOURNAMENT.value:
+            return JsonResponse({'errorCode': '400', 'message': f'Room {room_code} is not a tournament game room'}, status=400)
+        if user_id != room.createdBy or not Player.objects.filter(roomId=room, id=user_id).exists():
+            return JsonResponse({'errorCode': '403', 'message': 'Forbidden'}, status=403)
+
+        # Every player of every match of the stage, in one query.
+        rosters = {}
+        for match_player in MatchPlayer.objects.filter(match__room=room, match__stage=stage) \
+                .select_related("match", "player").order_by("match__position", "player__bracketsPosition"):
+            rosters.setdefault(match_player.match, []).append(match_player.player)
+        if not rosters:
+            return JsonResponse({'errorCode': '404', 'message': f'No matches for stage {stage}'}, status=404)
+
+        # Matches that have both players and no game yet, unless one was requested recently.
+        now = timezone.now()
+        stale = now - timedelta(seconds=settings.GAME_CREATE_TIMEOUT)
+        ready = [
+            match.id for match, players in rosters.items()
+            if str(match.status) == "1" and len(players) == 2 and not match.gameId
+            and (match.gameRequestedAt is None or match.gameRequestedAt <= stale)
+        ]
+        claimed = set()
+        if ready:
+            with transaction.atomic():
+                # A concurrent call for the same stage waits here and then finds the matches claimed.
+                claimed = set(Match.objects.select_for_update().filter(id__in=ready, status=1, gameId__isnull=True)
+                              .filter(Q(gameRequestedAt__isnull=True) | Q(gameRequestedAt__lte=stale))
+                              .values_list("id", flat=True))
+                messages = [
+                    {
+                        "type": "create_game",
+                        "roomId": room.id,
+                        "roomType": room.type,
+                        "matchId": match.id,
+                        "isSinglePlayer": False,
+                        "stage": stage,
+                        "ownerId": user_id,
+                        "players": [
+                            {
+                                "id": player.id,
+                                "name": player.name,
+                                "color": player.profileColor,
+                            }
+                            for player in players
+                        ]
+                    }
+                    for match, players in rosters.items() if match.id in claimed
+                ]
+                if messages:
+                    Match.objects.filter(id__in=claimed).update(gameRequestedAt=now, updatedAt=now)
+                    Room.objects.filter(id=room.id).update(status=RoomStatus.CREATING_GAME.value, updatedAt=now)
+                    invalidate_lobby_on_commit()
+                    bump_room_version_on_commit(room.code)
+                    publish_room_status_on_commit(room.code, RoomStatus.CREATING_GAME.value)
+                    enqueue_many(settings.GAME_CREATE_QUEUE, messages)
+            if claimed:
+                logger.info(f"{StageGamesView.__name__} | Room {room_code} | stage {stage} | {len(claimed)} games queued")
+
+        results = [
+            {
+                "matchId": match.id,
+                "position": match.position,
+                "players": [player.id for player in players],
+                "status": "queued" if match.id in claimed else self.match_state(match, players),
+            }
+            for match, players in rosters.items()
+        ]
+        return JsonResponse({"roomCode": room.code, "stage": stage, "matches": results}, status=201 if claimed else 409)
+
+    @staticmethod
+    def match_state(match, players):
+        """Why a match was not queued, from its real state."""
+        status = str(match.status)
+        if status == "3":
+            return "finished"
+        if status == "2":
+            return "in-progress"
+        if status != "1" or len(players) != 2:
+            return "not-filled"
+        if match.gameId:
+            return "game-created"
+        return "creating"
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("players", "0010_alter_player_userid"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="player",
+            name="roomCode",
+            field=models.CharField(db_index=True, max_length=64),
+        ),
+    ]
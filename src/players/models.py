@@ -16,7 +16,7 @@ class Player(models.Model):
     name = models.CharField(max_length=100)
     userId = models.CharField(max_length=64, db_index=True, editable=False)
     roomId = models.ForeignKey(Room, related_name='players', on_delete=models.CASCADE)
-    roomCode = models.CharField(max_length=64)
+    roomCode = models.CharField(max_length=64, db_index=True)
     profileColor = models.IntegerField(choices=[
         (1, "Red"),
         (2, "Blue"),
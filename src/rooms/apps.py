@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class RoomsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "rooms"
+
+    def ready(self):
+        from . import lobby  # noqa: F401 (connects the lobby cache invalidation signals)
+        from . import versions  # noqa: F401 (connects the room version signals)
+        from . import status  # noqa: F401 (connects the room status publishing signals)
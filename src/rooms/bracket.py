@@ -0,0 +1,56 @@
+from django.db import transaction
+
+from .models import Match, TournamentBracket
+from .versions import bump_room_version_on_commit
+from players.models import Player, MatchPlayer
+
+def build_snapshot(room):
+    """
+    Everything TournamentView needs that does not live on the room row: who is
+    in the room and at which bracket position, who is seated in the current
+    stage, and who has won a match.
+    """
+    rows = list(Player.objects.filter(roomId=room).values('id', 'name', 'urlProfileImage', 'profileColor', 'bracketsPosition'))
+    if room.stage == 1:
+        seated = {row['id'] for row in rows}
+    elif room.stage > 1:
+        seated = set(MatchPlayer.objects.filter(match__room=room, match__status=1).values_list('player_id', flat=True))
+    else:
+        seated = set()
+
+    return {
+        'stage': room.stage,
+        'members': {row['id']: row['bracketsPosition'] for row in rows},
+        'players': {
+            str(row['bracketsPosition']): {
+                'id': row['id'],
+                'name': row['name'],
+                'urlProfileImage': row['urlProfileImage'],
+                'color': row['profileColor'],
+            }
+            for row in rows if row['id'] in seated and row['bracketsPosition'] > 0
+        },
+        'winners': list(Match.objects.filter(room=room, winner__isnull=False).values_list('winner', flat=True).distinct()),
+    }
+
+def refresh_bracket(room_id):
+    """
+    Rebuilds the room's bracket snapshot. The bracket row is locked before the
+    snapshot is read, so two writers finishing at once (sibling game-overs, a
+    join and a leave) apply one after the other and the last one sees both.
+    Callers already in a transaction (finish_match, join_room) hold the lock in
+    theirs instead of paying for a savepoint.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        with transaction.atomic():
+            return refresh_bracket(room_id)
+
+    locked = TournamentBracket.objects.select_for_update(of=('self',)).select_related('room').filter(room_id=room_id)
+    bracket = locked.first()
+    if bracket is None:
+        TournamentBracket.objects.bulk_create([TournamentBracket(room_id=room_id)], ignore_conflicts=True)
+        bracket = locked.first()
+    bracket.snapshot = build_snapshot(bracket.room)
+    bracket.save(update_fields=['snapshot', 'updatedAt'])
+    bump_room_version_on_commit(bracket.room.code)
+    return bracket
@@ -0,0 +1,115 @@
+import json
+import time
+import hashlib
+import logging
+
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Room
+from players.models import Player
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "lobby:version"
+
+class LocalLobbyCache:
+    """Small per-process LRU in front of Redis. Keys carry the lobby version, so entries never go stale."""
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+local_cache = LocalLobbyCache(settings.LOBBY_LOCAL_SIZE)
+
+def lobby_version():
+    try:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Start from the clock so a lost counter never brings old pages back.
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+    except Exception as e:
+        logger.error(f"Error | lobby_version | {e}")
+        return None
+
+def cached_lobby(view, params, compute):
+    """
+    Returns the lobby page `view` renders for `params`, computing it only on a miss.
+    Pages live under the current lobby version, first in this process and then in
+    Redis; `invalidate_lobby` bumps the version. Without Redis every call computes.
+    """
+    version = lobby_version()
+    if version is None:
+        return compute()
+
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    key = f"lobby:{version}:{view}:{digest}"
+    value = local_cache.get(key)
+    if value is not None:
+        return value
+
+    try:
+        value = cache.get(key)
+    except Exception as e:
+        logger.error(f"Error | cached_lobby | {e}")
+        return compute()
+    if value is None:
+        value = compute()
+        try:
+            cache.set(key, value, settings.LOBBY_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"Error | cached_lobby | {e}")
+    local_cache.set(key, value, settings.LOBBY_CACHE_TTL)
+    return value
+
+def invalidate_lobby():
+    try:
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+    except Exception as e:
+        logger.error(f"Error | invalidate_lobby | {e}")
+
+def invalidate_lobby_on_commit():
+    """Bumps the version once the current transaction commits, so no reader caches rows about to change."""
+    transaction.on_commit(invalidate_lobby)
+
+# Model signals cover save() and delete(), including queryset deletes. Code that
+# changes rooms or players with update() or bulk writes calls invalidate_lobby_on_commit().
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def room_changed(sender, **kwargs):
+    invalidate_lobby_on_commit()
+
+@receiver(post_save, sender=Player)
+def player_saved(sender, created, **kwargs):
+    if created:
+        invalidate_lobby_on_commit()
+
+@receiver(post_delete, sender=Player)
+def player_deleted(sender, **kwargs):
+    invalidate_lobby_on_commit()
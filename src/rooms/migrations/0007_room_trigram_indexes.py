@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:38
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class RunPostgresSQL(migrations.RunSQL):
+    """
+    GIN trigram indexes only exist on Postgres. They are kept out of the model state
+    so other backends never try to recreate them (SQLite rebuilds tables on AlterField).
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rooms", "0006_room_stage"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        # Same expressions icontains compiles to: UPPER("name"::text) LIKE UPPER('%term%').
+        RunPostgresSQL(
+            'CREATE INDEX "room_name_trgm_idx" ON "rooms_room" USING gin ((UPPER("name"::text)) gin_trgm_ops);',
+            'DROP INDEX IF EXISTS "room_name_trgm_idx";',
+        ),
+        RunPostgresSQL(
+            'CREATE INDEX "room_code_trgm_idx" ON "rooms_room" USING gin ((UPPER("code"::text)) gin_trgm_ops);',
+            'DROP INDEX IF EXISTS "room_code_trgm_idx";',
+        ),
+    ]
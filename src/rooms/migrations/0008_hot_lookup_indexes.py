@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:39
+
+import uuid
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_room_codes(apps, schema_editor):
+    """
+    Codes were never unique, so re-code every room but the oldest of each clashing
+    group (and its players) before the unique constraint goes on.
+    """
+    Room = apps.get_model("rooms", "Room")
+    Player = apps.get_model("players", "Player")
+    taken = set(Room.objects.values_list("code", flat=True))
+    clashes = Room.objects.values("code").annotate(rooms=Count("id")).filter(rooms__gt=1).values_list("code", flat=True)
+    for code in list(clashes):
+        for room in Room.objects.filter(code=code).order_by("createdAt", "id")[1:]:
+            new_code = str(uuid.uuid4())[:8]
+            while new_code in taken:
+                new_code = str(uuid.uuid4())[:8]
+            taken.add(new_code)
+            Room.objects.filter(id=room.id).update(code=new_code)
+            Player.objects.filter(roomId=room.id).update(roomCode=new_code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rooms", "0007_room_trigram_indexes"),
+        ("players", "0010_alter_player_userid"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_room_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="match",
+            name="gameId",
+            field=models.CharField(db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name="room",
+            name="code",
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="room",
+            index=models.Index(condition=models.Q(("amountOfPlayers__lt", models.F("maxAmountOfPlayers")), ("privateRoom", False), ("status__lt", 3)), fields=["name", "id"], name="room_lobby_idx"),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+def fill_slot_masks(apps, schema_editor):
+    """Marks the colors and bracket positions current players already hold."""
+    Room = apps.get_model("rooms", "Room")
+    Player = apps.get_model("players", "Player")
+    masks = {}
+    for room_id, room_type, color, position in Player.objects.values_list("roomId", "roomId__type", "profileColor", "bracketsPosition"):
+        color_slots, bracket_slots = masks.get(room_id, (0, 0))
+        if room_type == 1:
+            bracket_slots |= 1 << (position - 1) if position > 0 else 0
+        else:
+            color_slots |= 1 << (color - 1) if color > 0 else 0
+        masks[room_id] = (color_slots, bracket_slots)
+    for room_id, (color_slots, bracket_slots) in masks.items():
+        Room.objects.filter(id=room_id).update(colorSlots=color_slots, bracketSlots=bracket_slots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rooms", "0008_hot_lookup_indexes"),
+        ("players", "0011_player_roomcode_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="bracketSlots",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="colorSlots",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_slot_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rooms", "0009_room_slot_masks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TournamentBracket",
+            fields=[
+                ("room", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name="bracket", serialize=False, to="rooms.room")),
+                ("snapshot", models.JSONField(default=dict)),
+                ("updatedAt", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
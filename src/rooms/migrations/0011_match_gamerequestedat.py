@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rooms", "0010_tournamentbracket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="match",
+            name="gameRequestedAt",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
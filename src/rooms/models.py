@@ -1,7 +1,7 @@
 import uuid
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from enum import Enum
 
 class roomTypes(Enum):
@@ -19,6 +19,8 @@ class RoomStatus(Enum):
     GAME_STARTED = 6
     GAME_ENDED = 7
 
+CODE_ATTEMPTS = 5
+
 class Room(models.Model):
     TYPE_CHOICES = [
         (0, "Match"),
@@ -42,7 +44,7 @@ class Room(models.Model):
     ]
 
     id = models.CharField(primary_key=True, max_length=64, editable=False)
-    code = models.CharField(max_length=64)
+    code = models.CharField(max_length=64, unique=True)
     name = models.CharField(max_length=100)
     maxAmountOfPlayers = models.IntegerField(default=2)
     amountOfPlayers = models.IntegerField(default=0)
@@ -50,19 +52,46 @@ class Room(models.Model):
     status = models.IntegerField(choices=STATUS_CHOICES, default=0)
     privateRoom = models.BooleanField(default=False)
     stage = models.IntegerField(default=1)
+    # Bit n-1 is set while color n / bracket position n is taken, see rooms.utils.claim_seat.
+    colorSlots = models.IntegerField(default=0)
+    bracketSlots = models.IntegerField(default=0)
     createdBy = models.CharField(max_length=64)
     createdAt = models.DateTimeField(auto_now_add=True)
     updatedBy = models.CharField(max_length=64)
     updatedAt = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Lobby search (name/code icontains) is served by the Postgres-only trigram
+        # indexes room_name_trgm_idx and room_code_trgm_idx, see migration 0007.
+        indexes = [
+            # Only the public, joinable rooms the lobby lists, in keyset order.
+            models.Index(
+                fields=["name", "id"],
+                condition=models.Q(privateRoom=False, status__lt=3, amountOfPlayers__lt=models.F("maxAmountOfPlayers")),
+                name="room_lobby_idx",
+            ),
+        ]
+
     def save(self, *args, **kwargs):
         if isinstance(self.status, RoomStatus):
             self.status = self.status.value 
-        if not self.id:
-            self.id = str(uuid.uuid4())
-        if not self.code:
-            self.code = str(self.id)[:8]
-        super().save(*args, **kwargs)
+        if self.code:
+            if not self.id:
+                self.id = str(uuid.uuid4())
+            return super().save(*args, **kwargs)
+
+        # The code is only the first 8 hex digits of the id, so a new room can draw
+        # one already in use; the unique index rejects it and we draw again.
+        given_id = self.id
+        for attempt in range(1, CODE_ATTEMPTS + 1):
+            self.id = given_id or str(uuid.uuid4())
+            self.code = (self.id if attempt == 1 else str(uuid.uuid4()))[:8]
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == CODE_ATTEMPTS:
+                    raise
         
     def __str__(self):
         return self.name
@@ -75,7 +104,9 @@ class Match(models.Model):
         (3, 'finished'),
     ]
     id = models.CharField(primary_key=True, max_length=64, editable=False)
-    gameId = models.CharField(max_length=64, editable=False, null=True)
+    gameId = models.CharField(max_length=64, editable=False, null=True, db_index=True)
+    # Set when a create_game message is queued for the match, until its gameId arrives.
+    gameRequestedAt = models.DateTimeField(null=True, editable=False)
     room = models.ForeignKey(Room, related_name='matchs', on_delete=models.CASCADE)
     stage = models.IntegerField(default=1)
     winner = models.CharField(max_length=64, editable=False, null=True)
@@ -93,4 +124,16 @@ class Match(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return self.id
\ No newline at end of file
+        return self.id
+
+class TournamentBracket(models.Model):
+    """
+    What TournamentView shows for a tournament room, precomputed by
+    rooms.bracket.refresh_bracket whenever the roster or a match result changes.
+    """
+    room = models.OneToOneField(Room, related_name='bracket', on_delete=models.CASCADE, primary_key=True)
+    snapshot = models.JSONField(default=dict)
+    updatedAt = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.room_id
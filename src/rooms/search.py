@@ -0,0 +1,26 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+def search_rooms(queryset, term, ranked=False):
+    """
+    Rooms whose name or code contains `term` (case-insensitive), which the trigram
+    indexes on UPPER(name) / UPPER(code) serve on Postgres. With `ranked`, best
+    matches come first: trigram similarity on Postgres, exact > prefix > substring
+    elsewhere.
+    """
+    queryset = queryset.filter(Q(name__icontains=term) | Q(code__icontains=term))
+    if not ranked:
+        return queryset
+    return queryset.annotate(relevance=relevance(term)).order_by("-relevance", "name", "id")
+
+def relevance(term):
+    if connection.vendor == "postgresql":
+        return Greatest(TrigramSimilarity("name", term), TrigramSimilarity("code", term))
+    return Case(
+        When(Q(name__iexact=term) | Q(code__iexact=term), then=Value(3)),
+        When(Q(name__istartswith=term) | Q(code__istartswith=term), then=Value(2)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
@@ -0,0 +1,117 @@
+import time
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Room
+
+logger = logging.getLogger(__name__)
+
+def status_key(room_code):
+    return f"room:{room_code}:status"
+
+def status_group(room_code):
+    return f"room_status_{room_code}"
+
+def room_status(room_code):
+    """
+    {"status", "version"} of the room, from the cache and from the database only
+    on a miss; None if the room does not exist. `version` changes exactly when the
+    status does, and is None while the cache is unreachable.
+    """
+    key = status_key(room_code)
+    try:
+        entry = cache.get(key)
+    except Exception as e:
+        logger.error(f"Error | room_status | {room_code} | {e}")
+        status = Room.objects.filter(code=room_code).values_list('status', flat=True).first()
+        return None if status is None else {'status': status, 'version': None}
+    if entry is not None:
+        return entry
+
+    status = Room.objects.filter(code=room_code).values_list('status', flat=True).first()
+    if status is None:
+        return None
+    try:
+        cache.add(key, {'status': status, 'version': time.time_ns()}, settings.ROOM_VERSION_TTL)
+        return cache.get(key)
+    except Exception as e:
+        logger.error(f"Error | room_status | {room_code} | {e}")
+        return {'status': status, 'version': None}
+
+def publish_room_status(room_code, status):
+    """
+    Records a new status and wakes everyone watching the room: long-poll waiters
+    on `room_status_<code>` and the RoomConsumer sockets on `room_<code>`. A save
+    that leaves the status alone wakes nobody. `status` None means the room is gone.
+    """
+    key = status_key(room_code)
+    entry = {'status': status, 'version': time.time_ns()}
+    try:
+        cached = cache.get(key)
+        if cached is not None and cached['status'] == status:
+            return
+        if status is None:
+            cache.delete(key)
+        else:
+            cache.set(key, entry, settings.ROOM_VERSION_TTL)
+    except Exception as e:
+        logger.error(f"Error | publish_room_status | {room_code} | {e}")
+        entry['version'] = None
+
+    event = {'type': 'room_status', 'roomCode': room_code, **entry}
+    try:
+        channel_layer = get_channel_layer()
+        async_to_sync(channel_layer.group_send)(status_group(room_code), event)
+        async_to_sync(channel_layer.group_send)(f"room_{room_code}", event)
+    except Exception as e:
+        logger.error(f"Error | publish_room_status | {room_code} | {e}")
+
+def publish_room_status_on_commit(room_code, status):
+    transaction.on_commit(lambda: publish_room_status(room_code, status))
+
+async def wait_for_status(room_code, since, timeout):
+    """
+    Returns (entry, changed). Answers at once when `since` is not the current
+    version; otherwise parks on the room's status group, costing no query, until
+    a change is published or `timeout` seconds pass. The group is joined before
+    the version is read, so a change in between is not missed.
+    """
+    if not since:
+        return await sync_to_async(room_status)(room_code), True
+
+    channel_layer = get_channel_layer()
+    channel = await channel_layer.new_channel()
+    group = status_group(room_code)
+    await channel_layer.group_add(group, channel)
+    try:
+        entry = await sync_to_async(room_status)(room_code)
+        if entry is None or entry['version'] is None or str(entry['version']) != since:
+            return entry, True
+        try:
+            event = await asyncio.wait_for(channel_layer.receive(channel), timeout)
+        except asyncio.TimeoutError:
+            return entry, False
+        if event['status'] is None:
+            return None, True
+        return {'status': event['status'], 'version': event['version']}, True
+    finally:
+        await channel_layer.group_discard(group, channel)
+
+# Room.save() covers creation and LockTournamentView; code that changes the status
+# with update() calls publish_room_status_on_commit().
+
+@receiver(post_save, sender=Room)
+def room_saved(sender, instance, **kwargs):
+    publish_room_status_on_commit(instance.code, instance.status)
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    publish_room_status_on_commit(instance.code, None)
@@ -67,6 +67,15 @@ class TournamentMatchesTestCase(TestCase):
         final_match = matches.get(stage=number_of_rounds)
         self.assertIsNone(final_match.nextMatch)
 
+    def test_bracket_is_written_in_constant_statements(self):
+        # Players read, matches insert, roster insert, plus the savepoint pair.
+        with self.assertNumQueries(5):
+            createTournamentMatches(self.room)
+
+        matches = Match.objects.filter(room=self.room)
+        self.assertEqual(list(matches.filter(stage=1).values_list('status', flat=True).distinct()), ['1'])
+        self.assertEqual(set(matches.filter(stage__gt=1).values_list('status', flat=True)), {'0'})
+
     def test_tournament_progression(self):
         createTournamentMatches(self.room)
         matches = Match.objects.filter(room=self.room)
@@ -104,11 +113,26 @@ class TournamentMatchesTestCase(TestCase):
 
 
 # tests antigos
-from django.test import TestCase, Client
+from django.db import connection, IntegrityError, OperationalError
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+import asyncio
+from unittest import mock, skipUnless
 from django.urls import reverse
 from django.http import JsonResponse
 import json
-from .models import Room
+import uuid
+from .models import Room, Match
+from .views import RoomGetView
+from .search import search_rooms
+from .keyset import approximate_count
+from .utils import join_room, release_seat, update_players_list, roster_change, merge_player_list_updates, RoomFull, SlotTaken
+from .bracket import refresh_bracket
+from .status import publish_room_status, wait_for_status
+from .versions import version_key, roster_version
+from django.core.cache import cache
 from players.models import Player
 
 class RoomStatusViewTest(TestCase):
@@ -134,6 +158,478 @@ class RoomStatusViewTest(TestCase):
         # Verificar se a resposta é 404 (Not Found)
         self.assertEqual(response.status_code, 404)
 
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class LobbyCacheTest(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(name='Lobby Room', maxAmountOfPlayers=2, amountOfPlayers=1)
+
+    def test_lobby_is_served_from_cache(self):
+        first = self.client.get(reverse('rooms'))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('rooms'))
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second.json()['totalItems'], 1)
+
+    def test_room_changes_invalidate_lobby(self):
+        self.client.get(reverse('rooms'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(name='Another Room', maxAmountOfPlayers=2, amountOfPlayers=1)
+        self.assertEqual(self.client.get(reverse('rooms')).json()['totalItems'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room.amountOfPlayers = 2
+            self.room.save()
+        self.assertEqual([room['roomName'] for room in self.client.get(reverse('rooms')).json()['content']], ['Another Room'])
+
+class LobbyCursorPaginationTest(TestCase):
+    def setUp(self):
+        for i in range(7):
+            Room.objects.create(name=f'Room {i % 3}', maxAmountOfPlayers=2, amountOfPlayers=1)
+        self.expected = list(Room.objects.order_by('name', 'id').values_list('code', flat=True))
+
+    def walk(self, url, direction, cursor):
+        """Follows `direction` cursors from `cursor`; returns the room codes in lobby order and the last page."""
+        pages = []
+        while cursor is not None:
+            data = self.client.get(url, {'cursor': cursor, 'size': 3}).json()
+            pages.append([room['roomCode'] for room in data['content']])
+            cursor = data[direction]
+        if direction == 'previousCursor':
+            pages.reverse()
+        return [code for page in pages for code in page], data
+
+    def test_cursor_pages_cover_the_lobby_in_both_directions(self):
+        for url in (reverse('rooms'), reverse('room-list')):
+            forward, last = self.walk(url, 'nextCursor', '')
+            self.assertEqual(forward, self.expected)
+            self.assertFalse(last['hasNextPage'])
+
+            backward, first = self.walk(url, 'previousCursor', last['previousCursor'])
+            self.assertEqual(backward, self.expected[:len(backward)])
+            self.assertEqual(len(backward) + len(last['content']), len(self.expected))
+            self.assertFalse(first['hasPreviousPage'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(reverse('rooms'), {'cursor': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('room-list'), {'cursor': 'nope'}).status_code, 400)
+
+    def test_cursor_rejects_relevance_order(self):
+        self.assertEqual(self.client.get(reverse('rooms'), {'cursor': '', 'filter': 'room', 'order': 'relevance'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('room-list'), {'cursor': '', 'search': 'room', 'order': 'relevance'}).status_code, 400)
+
+class LobbySearchTest(TestCase):
+    def setUp(self):
+        for name in ['The Arena', 'Arena Pro', 'Arena', 'Pong Club']:
+            Room.objects.create(name=name, maxAmountOfPlayers=2, amountOfPlayers=1)
+
+    def test_search_keeps_contains_semantics(self):
+        for url, param in ((reverse('rooms'), 'filter'), (reverse('room-list'), 'search')):
+            names = [room['roomName'] for room in self.client.get(url, {param: 'ARENA'}).json()['content']]
+            self.assertEqual(names, ['Arena', 'Arena Pro', 'The Arena'])
+
+    def test_ranked_search_puts_best_match_first(self):
+        for url, param in ((reverse('rooms'), 'filter'), (reverse('room-list'), 'search')):
+            names = [room['roomName'] for room in self.client.get(url, {param: 'arena', 'order': 'relevance'}).json()['content']]
+            self.assertEqual(names[0], 'Arena')
+            self.assertCountEqual(names, ['Arena', 'Arena Pro', 'The Arena'])
+
+@skipUnless(connection.vendor == 'postgresql', 'index scans are checked on Postgres')
+class HotQueryIndexTest(TestCase):
+    """The test tables are tiny, so sequential scans are switched off and the plan must name the expected index."""
+    def setUp(self):
+        self.room = Room.objects.create(name='Indexed Room', maxAmountOfPlayers=2, amountOfPlayers=1)
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn('Index', plan)
+        self.assertIn(index, plan)
+
+    def test_room_by_code(self):
+        self.assertUsesIndex(Room.objects.filter(code=self.room.code), 'rooms_room_code')
+
+    def test_players_by_room_code(self):
+        self.assertUsesIndex(Player.objects.filter(roomCode=self.room.code), 'players_player_roomCode')
+
+    def test_match_by_game_id(self):
+        self.assertUsesIndex(Match.objects.filter(gameId='game'), 'rooms_match_gameId')
+
+    def test_lobby_page(self):
+        self.assertUsesIndex(RoomGetView.lobby_rooms('').order_by('name', 'id')[:10], 'room_lobby_idx')
+
+    def test_lobby_search(self):
+        self.assertUsesIndex(search_rooms(Room.objects.all(), 'dexed'), 'room_name_trgm_idx')
+
+class ApproximateCountTest(TestCase):
+    def setUp(self):
+        for i in range(3):
+            Room.objects.create(name=f'Counted Room {i}', maxAmountOfPlayers=2, amountOfPlayers=1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'the planner estimate is read on Postgres')
+    def test_planner_estimate(self):
+        count, approximate = approximate_count(Room.objects.filter(name__startswith='Counted'))
+        self.assertTrue(approximate)
+        self.assertIsInstance(count, int)
+        self.assertGreaterEqual(count, 0)
+
+    @skipUnless(connection.vendor != 'postgresql', 'exact counts are used off Postgres')
+    def test_exact_count(self):
+        self.assertEqual(approximate_count(Room.objects.filter(name__startswith='Counted')), (3, False))
+
+class RoomCodeTest(TestCase):
+    def test_colliding_code_is_redrawn(self):
+        Room.objects.create(name='First', code='deadbeef')
+        draws = [uuid.UUID('deadbeef-0000-4000-8000-000000000001'), uuid.UUID('cafef00d-0000-4000-8000-000000000002'), uuid.UUID('0badc0de-0000-4000-8000-000000000003')]
+        with mock.patch('rooms.models.uuid.uuid4', side_effect=draws):
+            room = Room.objects.create(name='Second')
+
+        self.assertEqual((room.id, room.code), (str(draws[1]), '0badc0de'))
+        self.assertEqual(Room.objects.filter(code='deadbeef').count(), 1)
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class JoinRoomTest(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(name='Join Room', maxAmountOfPlayers=2, amountOfPlayers=0)
+
+    def join(self, name):
+        return self.client.put(reverse('add-player', args=[self.room.code]), {'playerName': name}, content_type='application/json')
+
+    def test_join_until_full(self):
+        self.assertEqual(self.join('Player 1').status_code, 201)
+        self.assertEqual(self.join('Player 2').status_code, 201)
+        response = self.join('Player 3')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'errorCode': '403', 'message': 'Room is full'})
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.amountOfPlayers, 2)
+        self.assertEqual(self.room.players.count(), 2)
+
+    def test_slots_are_distinct_and_released(self):
+        # Read, insert and claim, plus the savepoint pair.
+        with self.assertNumQueries(2 * 5):
+            first = join_room(self.room, 'Player 1')
+            second = join_room(self.room, 'Player 2')
+        self.assertEqual((first.profileColor, second.profileColor), (1, 2))
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.colorSlots, 0b11)
+
+        release_seat(self.room, first)
+        first.delete()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.colorSlots, 0b10)
+        self.assertEqual(join_room(self.room, 'Player 3').profileColor, 1)
+
+    def test_tournament_positions_are_distinct(self):
+        room = Room.objects.create(name='Join Cup', type=1, maxAmountOfPlayers=4, amountOfPlayers=0)
+        players = [join_room(room, f'Player {i}') for i in range(4)]
+
+        self.assertEqual(sorted(player.bracketsPosition for player in players), [1, 2, 3, 4])
+        room.refresh_from_db()
+        self.assertEqual(room.bracketSlots, 0b1111)
+        self.assertEqual(Match.objects.filter(room=room).count(), 3)
+
+    def test_contention_is_retryable(self):
+        for error, status in ((SlotTaken('taken'), 409), (IntegrityError('duplicate'), 409), (OperationalError('deadlock'), 503)):
+            with mock.patch('rooms.views.join_room', side_effect=error):
+                response = self.join('Player 1')
+            self.assertEqual(response.status_code, status)
+            self.assertEqual(response.json()['errorCode'], str(status))
+            self.assertEqual(response['Retry-After'], '1')
+
+class TournamentBracketTest(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(name='Bracket Cup', type=1, maxAmountOfPlayers=4, amountOfPlayers=0)
+        self.players = [join_room(self.room, f'Player {i}') for i in range(4)]
+        self.by_position = {player.bracketsPosition: player for player in self.players}
+
+    def get(self, player):
+        return self.client.get(reverse('tournament', args=[self.room.code]), headers={'X-User-Id': player.id})
+
+    def test_served_from_one_read(self):
+        with self.assertNumQueries(1):
+            response = self.get(self.by_position[1])
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['round'], 1)
+        self.assertEqual(data['numberOfPlayers'], 4)
+        self.assertEqual(data['players']['2']['name'], self.by_position[2].name)
+        self.assertTrue(data['players']['1']['you'])
+        self.assertFalse(data['players']['2']['you'])
+        self.assertTrue(data['owner'])
+
+    def test_snapshot_follows_results(self):
+        winner = self.by_position[3]
+        semi = Match.objects.get(room=self.room, stage=1, position=2)
+        final = Match.objects.get(room=self.room, stage=2)
+        semi_winner = self.by_position[1]
+        Match.objects.filter(room=self.room, stage=1).update(status=3)
+        Match.objects.filter(id=semi.id).update(winner=winner.id)
+        Player.objects.filter(id=winner.id).update(bracketsPosition=2)
+        MatchPlayer.objects.bulk_create([MatchPlayer(match=final, player=semi_winner), MatchPlayer(match=final, player=winner)])
+        Match.objects.filter(id=final.id).update(status=1)
+        Room.objects.filter(id=self.room.id).update(stage=2)
+        refresh_bracket(self.room.id)
+
+        data = self.get(winner).json()
+        self.assertEqual(data['round'], 2)
+        self.assertEqual(data['players'], {
+            '1': {'name': semi_winner.name, 'urlProfileImage': semi_winner.urlProfileImage, 'color': semi_winner.profileColor},
+            '2': {'name': winner.name, 'urlProfileImage': winner.urlProfileImage, 'color': winner.profileColor},
+        })
+        self.assertTrue(data['winner'])
+        self.assertFalse(self.get(self.by_position[2]).json()['winner'])
+
+    def test_strangers_are_forbidden(self):
+        response = self.client.get(reverse('tournament', args=[self.room.code]), headers={'X-User-Id': 'nobody'})
+        self.assertEqual(response.status_code, 403)
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class RoomEtagTest(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(name='Etag Room', maxAmountOfPlayers=3, amountOfPlayers=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner = join_room(self.room, 'Owner')
+            self.guest = join_room(self.room, 'Guest')
+
+    def get(self, player, etag=None):
+        headers = {'X-User-Id': player.id}
+        if etag:
+            headers['If-None-Match'] = etag
+        return self.client.get(reverse('match', args=[self.room.code]), headers=headers)
+
+    def test_unchanged_room_is_not_modified(self):
+        first = self.get(self.owner)
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(0):
+            second = self.get(self.owner, first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_tag_is_per_user(self):
+        owner, guest = self.get(self.owner), self.get(self.guest)
+        self.assertNotEqual(owner['ETag'], guest['ETag'])
+        self.assertEqual(self.get(self.guest, owner['ETag']).status_code, 200)
+
+    def test_mutations_change_the_tag(self):
+        etag = self.get(self.owner)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            join_room(self.room, 'Late')
+        response = self.get(self.owner, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['amountOfPlayers'], 3)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.filter(id=self.room.id).update(status=3)
+            release_seat(self.room, self.guest)
+        self.assertEqual(self.get(self.owner, etag).status_code, 200)
+
+    def test_status_endpoint(self):
+        first = self.client.get(reverse('room-status', args=[self.room.code]))
+        second = self.client.get(reverse('room-status', args=[self.room.code]), headers={'If-None-Match': first['ETag']})
+        self.assertEqual(second.status_code, 304)
+
+    def test_unknown_room_is_not_tagged(self):
+        response = self.client.get(reverse('match', args=['nowhere']), headers={'X-User-Id': self.owner.id})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNone(cache.get(version_key('nowhere')))
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+)
+class RoomStatusWatchTest(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room = Room.objects.create(name='Watched Room', maxAmountOfPlayers=2, amountOfPlayers=2)
+
+    def watch(self, **params):
+        return self.async_client.get(reverse('room-status-watch', args=[self.room.code]), params)
+
+    async def test_current_status_without_since(self):
+        response = await self.watch()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], '0')
+
+    async def test_waiter_wakes_on_status_change(self):
+        version = (await self.watch()).json()['version']
+        waiter = asyncio.ensure_future(wait_for_status(self.room.code, version, 5))
+        await asyncio.sleep(0.1)
+        self.assertFalse(waiter.done())
+
+        await sync_to_async(publish_room_status)(self.room.code, 3)
+        entry, changed = await asyncio.wait_for(waiter, 2)
+        self.assertTrue(changed)
+        self.assertEqual(entry['status'], 3)
+        self.assertNotEqual(str(entry['version']), version)
+
+    async def test_unchanged_status_times_out(self):
+        version = (await self.watch()).json()['version']
+        await sync_to_async(publish_room_status)(self.room.code, 0)
+        response = await self.watch(since=version, timeout=0.1)
+        self.assertEqual(response.status_code, 304)
+
+    async def test_stale_version_answers_at_once(self):
+        response = await asyncio.wait_for(self.watch(since='1', timeout=5), 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], '0')
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    PLAYER_LIST_UPDATE_WINDOW=1,
+)
+@mock.patch('rooms.utils.Timer')
+class PlayerListUpdateTest(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(name='Busy Lobby', maxAmountOfPlayers=4, amountOfPlayers=0)
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(f"room_{self.room.code}", self.channel)
+
+    def received(self):
+        async def drain():
+            events = []
+            while True:
+                try:
+                    events.append(await asyncio.wait_for(self.layer.receive(self.channel), 0.05))
+                except asyncio.TimeoutError:
+                    return events
+        return async_to_sync(drain)()
+
+    def end_window(self, timer):
+        """Runs the flushes update_players_list scheduled, as the timers would."""
+        for window, flush, args in (call.args for call in timer.call_args_list):
+            self.assertEqual(window, 1)
+            flush(*args)
+        timer.reset_mock()
+
+    def join(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [join_room(self.room, f'Player {i}') for i in range(count)]
+
+    def test_updates_in_a_window_are_coalesced(self, timer):
+        for i in range(4):
+            update_players_list(self.room.code, "")
+        self.assertEqual(self.received(), [])
+        timer.assert_called_once()
+
+        self.end_window(timer)
+        event, = self.received()
+        self.assertEqual(event['changes'], [])
+        self.assertEqual(event['since'], event['version'])
+
+    def test_changes_in_a_window_are_sent_once(self, timer):
+        players = self.join(3)
+        with mock.patch('rooms.utils.async_to_sync', wraps=async_to_sync) as send:
+            for player in players:
+                update_players_list(self.room.code, "", [roster_change("added", player, self.room)])
+            update_players_list(self.room.code, "")
+            self.assertEqual(send.call_count, 0)
+            self.end_window(timer)
+            self.assertEqual(send.call_count, 1)
+
+        event, = self.received()
+        self.assertEqual([change['name'] for change in event['changes']], ['Player 0', 'Player 1', 'Player 2'])
+        self.assertEqual(event['changes'][0], {
+            'op': 'added', 'color': 1, 'name': 'Player 0', 'urlProfileImage': players[0].urlProfileImage, 'owner': False,
+        })
+        self.assertEqual(event['version'] - event['since'], 3)
+
+    def test_changes_are_always_sent_and_numbered(self, timer):
+        players = self.join(3)
+        update_players_list(self.room.code, "", [roster_change("added", players[0], self.room)])
+        self.end_window(timer)
+        for player in players[1:]:
+            update_players_list(self.room.code, "", [roster_change("added", player, self.room)])
+        self.end_window(timer)
+        first, second = self.received()
+
+        self.assertEqual([change['color'] for change in first['changes']], [1])
+        self.assertEqual([change['color'] for change in second['changes']], [2, 3])
+        self.assertEqual(first['version'] - first['since'], 1)
+        self.assertEqual(second['since'], first['version'])
+        self.assertEqual(second['version'] - second['since'], 2)
+
+    def test_a_missing_delta_makes_clients_refetch(self, timer):
+        players = self.join(2)
+        for player in players:
+            update_players_list(self.room.code, "", [roster_change("added", player, self.room)])
+        cache.delete(f"room:{self.room.code}:roster:{roster_version(self.room.code)}")
+        self.end_window(timer)
+        event, = self.received()
+        self.assertIsNone(event['since'])
+        self.assertEqual(event['version'], roster_version(self.room.code))
+
+    def test_merge_orders_deltas_and_flags_gaps(self, timer):
+        events = [
+            {'since': 1, 'version': 2, 'changes': ['b']},
+            {'since': 0, 'version': 1, 'changes': ['a']},
+            {'since': 2, 'version': 3, 'changes': ['c']},
+        ]
+        merged = merge_player_list_updates(events)
+        self.assertEqual((merged['since'], merged['version'], merged['changes']), (0, 3, ['a', 'b', 'c']))
+        self.assertIsNone(merge_player_list_updates([events[1], events[2]])['since'])
+
+    def test_room_detail_carries_the_roster_version(self, timer):
+        player, = self.join(1)
+        update_players_list(self.room.code, "", [roster_change("added", player, self.room)])
+        self.end_window(timer)
+        event, = self.received()
+        response = self.client.get(reverse('match', args=[self.room.code]), headers={'X-User-Id': player.id})
+        self.assertEqual(response.json()['rosterVersion'], event['version'])
+
+    def test_removals_are_never_coalesced(self, timer):
+        update_players_list(self.room.code, "")
+        update_players_list(self.room.code, 2)
+        update_players_list(self.room.code, 3)
+        self.assertEqual([event['userRemoved'] for event in self.received()], [2, 3])
+        self.end_window(timer)
+        self.assertEqual([event['userRemoved'] for event in self.received()], [''])
+
+    @override_settings(PLAYER_LIST_UPDATE_WINDOW=0)
+    def test_no_window_sends_every_update(self, timer):
+        players = self.join(2)
+        for player in players:
+            update_players_list(self.room.code, "", [roster_change("added", player, self.room)])
+        first, second = self.received()
+        self.assertEqual(second['since'], first['version'])
+        timer.assert_not_called()
+
+@skipUnless(connection.vendor == 'postgresql', 'needs concurrent connections')
+class ConcurrentJoinRoomTest(TransactionTestCase):
+    def test_join_storm_never_oversubscribes(self):
+        room = Room.objects.create(name='Busy Room', maxAmountOfPlayers=4, amountOfPlayers=0)
+
+        def join(i):
+            try:
+                join_room(room, f'Player {i}')
+                return True
+            except RoomFull:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            joined = list(pool.map(join, range(12)))
+
+        room.refresh_from_db()
+        self.assertEqual(joined.count(True), 4)
+        self.assertEqual(room.amountOfPlayers, 4)
+        self.assertEqual(room.players.count(), 4)
+        self.assertEqual(sorted(room.players.values_list('profileColor', flat=True)), [1, 2, 3, 4])
+        self.assertEqual(room.colorSlots, 0b1111)
+
 # class CreateRoomViewTest(TestCase):
 #     def setUp(self):
 #         self.client = Client()
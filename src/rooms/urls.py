@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import RoomStatusView, CreateRoomView, RoomView, TournamentView, RoomGetView, AddPlayerToRoomView, RemovePlayerView, LockTournamentView
+from .views import RoomStatusView, RoomStatusWatchView, CreateRoomView, RoomView, TournamentView, RoomGetView, AddPlayerToRoomView, RemovePlayerView, LockTournamentView
 
 urlpatterns = [
     path('', RoomGetView.as_view(), name='rooms'),
@@ -8,6 +8,7 @@ urlpatterns = [
     path('<str:room_code>/detail/', RoomView.as_view(), name='match'),
     path('<str:room_code>/tournament/', TournamentView.as_view(), name='tournament'),
     path('<str:room_code>/status/', RoomStatusView.as_view(), name='room-status'),
+    path('<str:room_code>/status/watch/', RoomStatusWatchView.as_view(), name='room-status-watch'),
     path('<str:room_code>/add-player/', AddPlayerToRoomView.as_view(), name='add-player'),
     path('<str:room_code>/<int:color>/remove-player/', RemovePlayerView.as_view(), name='remove-player'),
     path('<str:room_code>/lock-tournament/', LockTournamentView.as_view(), name='lock-tournament')
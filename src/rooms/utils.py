@@ -1,11 +1,32 @@
+import uuid
 import random
 import math
+import logging
+
+from threading import Timer
 
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
 
 from .models import roomTypes, Room, Match
 from players.models import Player, playerColors, MatchPlayer
+from .lobby import invalidate_lobby_on_commit
+from .versions import bump_room_version_on_commit, roster_version, bump_roster_version
+from .bracket import refresh_bracket
+
+logger = logging.getLogger(__name__)
+
+JOIN_ATTEMPTS = 3
+PLAYER_LIST_FLUSH_GRACE = 5  # Seconds a window key and buffered deltas outlive a late flush
+PLAYER_LIST_MAX_DELTA = 256  # Versions one flush reads before telling clients to refetch instead
+
+class RoomFull(Exception):
+    """Every seat of the room is taken."""
 
 def get_room_type_range(room_type):
     if not room_type:
@@ -66,73 +87,272 @@ def validate_amount_players(data, field, field_type, room_type):
         raise ValueError(f"'{field}' is not a valid size of players.")
     return value
 
-def setPlayerColor(room_code):
-    room = Room.objects.filter(code=room_code).first()
-    profileColor = 0
-    used_colors = Player.objects.filter(roomCode=room_code).values_list('profileColor', flat=True)
-    all_colors = {color.value for color in playerColors}
-    available_colors = all_colors - set(used_colors)
-    if available_colors:
-        profileColor = available_colors.pop()
-    return profileColor
+def slot_bit(slot):
+    """Bit of color or bracket position `slot` (1-based) in the room's slot masks; 0 for no slot."""
+    return 1 << (slot - 1) if slot > 0 else 0
+
+def free_slots(mask, size):
+    return [slot for slot in range(1, size + 1) if not mask & slot_bit(slot)]
 
-def setBracketsPosition(room_code):
-    room = Room.objects.filter(code=room_code).first()
-    used_positions = room.players.values_list('bracketsPosition', flat=True)
-    used_positions_list = list(used_positions)
+def pick_color(mask):
+    """Lowest color not taken in `mask`, or 0 when every color is in use."""
+    free = free_slots(mask, len(playerColors))
+    return free[0] if free else 0
 
-    avaliable_positions_list = list(filter(lambda x: x not in used_positions_list, list(range(1,room.maxAmountOfPlayers + 1))))
-    return random.choice(avaliable_positions_list)
+def pick_bracket_position(mask, size):
+    free = free_slots(mask, size)
+    return random.choice(free) if free else 0
 
+def occupy_slots(room, player):
+    """Marks the player's slot as taken on an unsaved room, for the creation paths."""
+    if room.type == roomTypes.TOURNAMENT.value:
+        room.bracketSlots |= slot_bit(player.bracketsPosition)
+    else:
+        room.colorSlots |= slot_bit(player.profileColor)
 
 def setFirstRound(room, first_round_matches):
-    players = Player.objects.filter(roomId=room).order_by('bracketsPosition')
+    """Seats the players pairwise by bracket position; the caller bulk-inserts the result."""
+    players = list(Player.objects.filter(roomId=room).order_by('bracketsPosition'))
+    match_players = []
     for match, player_pair in zip(first_round_matches, zip(players[::2], players[1::2])):
         player_one, player_two = player_pair
-        # Correctly assign 'match' and 'player' foreign keys
-        MatchPlayer.objects.create(match=match, player=player_one, position=1)
-        MatchPlayer.objects.create(match=match, player=player_two)
+        match_players += [
+            MatchPlayer(match=match, player=player_one, position=1),
+            MatchPlayer(match=match, player=player_two),
+        ]
         match.status = 1
-        match.save()
+    return match_players
 
 def createTournamentMatches(room):
+    """
+    Writes the whole bracket in three statements whatever its size: the players
+    read, one bulk INSERT of every match and one of the first-round roster. IDs
+    are generated up front, from the final down, so each match is created with
+    its nextMatch already set.
+    """
     number_of_rounds = math.ceil(math.log2(room.maxAmountOfPlayers))
     matches = {}
 
-    # Create all matches for each round
-    for round_number in range(1, number_of_rounds + 1):
-        matches_in_round = []
+    next_round = []
+    for round_number in range(number_of_rounds, 0, -1):
         num_matches = 2 ** (number_of_rounds - round_number)
-        for match_position in range(1, num_matches + 1):
-            match = Match.objects.create(
+        matches[round_number] = [
+            Match(
+                id=str(uuid.uuid4()),
                 room=room,
                 stage=round_number,
                 status=0,
-                position=match_position
+                position=match_position,
+                nextMatch=next_round[(match_position - 1) // 2].id if next_round else None,
             )
-            matches_in_round.append(match)
-        matches[round_number] = matches_in_round
-
-    # Link matches to next matches
-    for round_number in range(1, number_of_rounds):
-        current_round = matches[round_number]
-        next_round = matches[round_number + 1]
-        for i in range(0, len(current_round), 2):
-            next_match = next_round[i // 2]
-            current_round[i].nextMatch = next_match.id
-            current_round[i].save()
-            current_round[i + 1].nextMatch = next_match.id
-            current_round[i + 1].save()
+            for match_position in range(1, num_matches + 1)
+        ]
+        next_round = matches[round_number]
 
     # Assign players to first round matches
-    setFirstRound(room, matches[1])
+    match_players = setFirstRound(room, matches[1])
+    with transaction.atomic():
+        Match.objects.bulk_create([match for round_number in sorted(matches) for match in matches[round_number]])
+        MatchPlayer.objects.bulk_create(match_players)
+
+class SlotTaken(Exception):
+    """Another joiner changed the room's slots between our read and our claim."""
+
+def claim_seat(room, seen, color_slots, bracket_slots):
+    """
+    Takes one seat and the joiner's color/bracket slots with a single conditional
+    UPDATE, valid only if the slot masks are still the ones in `seen`. Returns False
+    when another joiner got there first; concurrent joiners never oversubscribe the
+    room or share a slot, and the row lock lasts only until the caller commits.
+    """
+    claimed = Room.objects.filter(
+        id=room.id,
+        amountOfPlayers__lt=F('maxAmountOfPlayers'),
+        colorSlots=seen['colorSlots'],
+        bracketSlots=seen['bracketSlots'],
+    ).exclude(type=roomTypes.SINGLE_PLAYER.value).update(
+        amountOfPlayers=F('amountOfPlayers') + 1,
+        colorSlots=color_slots,
+        bracketSlots=bracket_slots,
+        updatedAt=timezone.now(),
+    )
+    if claimed:
+        invalidate_lobby_on_commit()
+        bump_room_version_on_commit(room.code)
+    return bool(claimed)
+
+def release_seat(room, player):
+    """Gives back the seat and the slots `player` held."""
+    Room.objects.filter(id=room.id, amountOfPlayers__gt=0).update(
+        amountOfPlayers=F('amountOfPlayers') - 1,
+        colorSlots=F('colorSlots').bitand(~slot_bit(player.profileColor)),
+        bracketSlots=F('bracketSlots').bitand(~slot_bit(player.bracketsPosition)),
+        updatedAt=timezone.now(),
+    )
+    invalidate_lobby_on_commit()
+    bump_room_version_on_commit(room.code)
+
+def join_room(room, player_name, attempts=JOIN_ATTEMPTS):
+    """
+    Adds `player_name` to `room` in one transaction: read the free slots, insert the
+    player with its color or bracket position, then claim seat and slots together so
+    the room row stays locked for as short as possible. Raises RoomFull when no seat
+    is left; deadlocks and slot conflicts are retried. Every lost claim means another
+    joiner took a seat, so a room of n seats needs at most n + 1 attempts.
+    """
+    is_tournament = room.type == roomTypes.TOURNAMENT.value
+    attempts = max(attempts, room.maxAmountOfPlayers + 1)
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                seen = Room.objects.filter(id=room.id) \
+                    .values('type', 'stage', 'amountOfPlayers', 'maxAmountOfPlayers', 'colorSlots', 'bracketSlots').get()
+                if seen['type'] == roomTypes.SINGLE_PLAYER.value or seen['amountOfPlayers'] >= seen['maxAmountOfPlayers']:
+                    raise RoomFull(f"Room {room.code} is full")
+
+                color_slots, bracket_slots = seen['colorSlots'], seen['bracketSlots']
+                if is_tournament:
+                    position = pick_bracket_position(bracket_slots, seen['maxAmountOfPlayers'])
+                    color = 1 if position % 2 == 0 else 0
+                    bracket_slots |= slot_bit(position)
+                else:
+                    position = 0
+                    color = pick_color(color_slots)
+                    color_slots |= slot_bit(color)
 
-def update_players_list(room_code, userRemoved):
+                player = Player.objects.create(
+                    name=player_name,
+                    roomCode=room.code,
+                    roomId=room,
+                    profileColor=color,
+                    bracketsPosition=position,
+                    urlProfileImage=f"/assets/img/{random.choice([1, 2])}.png"
+                )
+                if not claim_seat(room, seen, color_slots, bracket_slots):
+                    raise SlotTaken(f"Room {room.code}")
+                # The claim matched the masks we read, so nobody joined or left in between.
+                room.amountOfPlayers = seen['amountOfPlayers'] + 1
+                room.stage = seen['stage']
+
+                if is_tournament:
+                    if room.stage == 1 and room.amountOfPlayers == room.maxAmountOfPlayers:
+                        createTournamentMatches(room)
+                    refresh_bracket(room.id)
+            return player
+        except (SlotTaken, IntegrityError, OperationalError) as e:
+            if attempt == attempts:
+                raise
+            logger.warning(f"Warn | join_room | Room {room.code} | attempt {attempt} failed, retrying | {e}")
+
+def roster_change(op, player, room):
+    """One entry of a player_list_update delta; `op` is "added" or "removed"."""
+    return {
+        "op": op,
+        "color": player.profileColor,
+        "name": player.name,
+        "urlProfileImage": player.urlProfileImage,
+        "owner": player.name == room.createdBy,
+    }
+
+def player_list_window_key(room_code):
+    return f"room:{room_code}:player_list"
+
+def roster_changes_key(room_code, version):
+    return f"room:{room_code}:roster:{version}"
+
+def update_players_list(room_code, userRemoved, changes=None):
+    """
+    Tells the room's sockets that the roster changed. Events carry the roster
+    `changes` and number them: the roster moves from version `since` to `version`,
+    so clients apply the delta and refetch only on a gap.
+
+    Removals go out at once, since the removed client has to know. Anything else is
+    buffered per room: each change is stored in the cache under its version, the
+    first update of a window schedules flush_players_list, and updates arriving
+    while the window is open send nothing. A room gets at most one event per
+    PLAYER_LIST_UPDATE_WINDOW seconds plus one per removal, however many players
+    join.
+    """
+    window = settings.PLAYER_LIST_UPDATE_WINDOW
+    if changes:
+        version = bump_roster_version(room_code)
+        since = version - 1 if version is not None else None
+    else:
+        version = since = roster_version(room_code)
+    if userRemoved or window <= 0 or version is None:
+        return send_players_list(room_code, userRemoved, changes or [], since, version)
+
+    try:
+        if changes:
+            cache.set(roster_changes_key(room_code, version), changes, window * 2 + PLAYER_LIST_FLUSH_GRACE)
+        # Outlives the window so that only the flush reopens it; it expires on its own
+        # if the process that owns it dies before flushing.
+        if not cache.add(player_list_window_key(room_code), since, window + PLAYER_LIST_FLUSH_GRACE):
+            return
+    except Exception as e:
+        logger.error(f"Error | update_players_list | {room_code} | {e}")
+        return send_players_list(room_code, userRemoved, changes or [], since, version)
+
+    timer = Timer(window, flush_players_list, (room_code, since))
+    timer.daemon = True
+    timer.start()
+
+def flush_players_list(room_code, since):
+    """
+    Sends everything buffered since the window opened at version `since` as one
+    event. A change whose delta is missing (evicted, or stored after we read) makes
+    the event a gap, so clients refetch instead of applying a partial delta.
+    """
+    try:
+        cache.delete(player_list_window_key(room_code))
+        version = roster_version(room_code)
+        if version is None or not 0 <= version - since <= PLAYER_LIST_MAX_DELTA:
+            return send_players_list(room_code, "", [], None, version)
+        versions = range(since + 1, version + 1)
+        stored = cache.get_many([roster_changes_key(room_code, v) for v in versions])
+        events = [
+            {"since": v - 1, "version": v, "changes": stored.get(roster_changes_key(room_code, v))}
+            for v in versions
+        ]
+        if not events or any(event["changes"] is None for event in events):
+            # Only sockets connected in this window, or a delta went missing.
+            return send_players_list(room_code, "", [], since if not events else None, version)
+        merged = merge_player_list_updates(events)
+        send_players_list(room_code, "", merged["changes"], merged["since"], merged["version"])
+    except Exception as e:
+        logger.error(f"Error | flush_players_list | {room_code} | {e}")
+
+def send_players_list(room_code, userRemoved, changes, since, version):
     channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
         f"room_{room_code}",
         {
             "type": "player_list_update",
             "userRemoved": userRemoved,
+            "changes": changes,
+            "since": since,
+            "version": version,
         }
-    )
\ No newline at end of file
+    )
+
+def merge_player_list_updates(events, userRemoved=""):
+    """
+    Folds the deltas buffered during a window into the one event flush_players_list
+    sends. Deltas are applied in version order; if the events do not chain
+    (`since` of each is the `version` before it), `since` is None and the client
+    refetches.
+    """
+    if any(event.get("version") is None for event in events):
+        since = version = None
+    else:
+        events = sorted(events, key=lambda event: (event["version"], event["since"]))
+        since, version = events[0]["since"], events[-1]["version"]
+        if any(event["since"] != previous["version"] for previous, event in zip(events, events[1:])):
+            since = None
+    return {
+        "type": "player_list_update",
+        "userRemoved": userRemoved,
+        "changes": [change for event in events for change in event.get("changes", [])],
+        "since": since,
+        "version": version,
+    }
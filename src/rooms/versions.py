@@ -0,0 +1,119 @@
+import time
+import hashlib
+import logging
+
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.views.decorators.http import condition
+
+from .models import Room
+from players.models import Player
+
+logger = logging.getLogger(__name__)
+
+def version_key(room_code):
+    return f"room:{room_code}:version"
+
+def roster_key(room_code):
+    return f"room:{room_code}:roster"
+
+def current_counter(key):
+    """
+    Reads never create the counter: a room nobody changed yet, or a code nobody
+    ever used, is at the initial version 0. Only bumps write keys.
+    """
+    version = cache.get(key)
+    return 0 if version is None else version
+
+def next_counter(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), settings.ROOM_VERSION_TTL)
+        return cache.get(key)
+
+def room_version(room_code):
+    """
+    The room's current version, a counter bumped on every change to the room, its
+    players or its bracket. Returns None when the cache is unreachable.
+    """
+    try:
+        return current_counter(version_key(room_code))
+    except Exception as e:
+        logger.error(f"Error | room_version | {room_code} | {e}")
+        return None
+
+def bump_room_version(room_code):
+    try:
+        next_counter(version_key(room_code))
+    except Exception as e:
+        logger.error(f"Error | bump_room_version | {room_code} | {e}")
+
+def roster_version(room_code):
+    """
+    Version of the room's roster as player_list_update events number it: each event
+    carrying a change moves it by exactly one. None when the cache is unreachable.
+    """
+    try:
+        return current_counter(roster_key(room_code))
+    except Exception as e:
+        logger.error(f"Error | roster_version | {room_code} | {e}")
+        return None
+
+def bump_roster_version(room_code):
+    try:
+        return next_counter(roster_key(room_code))
+    except Exception as e:
+        logger.error(f"Error | bump_roster_version | {room_code} | {e}")
+        return None
+
+def bump_room_version_on_commit(room_code):
+    """Bumps once the current transaction commits, so no poller caches rows about to change."""
+    transaction.on_commit(lambda: bump_room_version(room_code))
+
+def room_etag(request, room_code, *args, **kwargs):
+    """
+    `etag_func` for room endpoints, see room_condition. The bodies differ per
+    caller ("you", owner flags), so the user is part of the tag. A matching
+    If-None-Match is answered with 304 from the cache alone.
+    """
+    version = room_version(room_code)
+    if version is None:
+        return None
+    user = request.headers.get("X-User-Id") or getattr(getattr(request, "user", None), "id", None) or ""
+    digest = hashlib.sha1(str(user).encode()).hexdigest()[:12]
+    return f"{room_code}-{version}-{digest}"
+
+def room_condition(view):
+    """
+    django.views.decorators.http.condition with room_etag, except that only 200s
+    (and the 304s they lead to) carry the ETag: condition() tags every response,
+    and a tagged 404 for an unknown code would be revalidated forever.
+    """
+    conditional = condition(etag_func=room_etag)(view)
+
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        response = conditional(request, *args, **kwargs)
+        if response.status_code not in (200, 304) and response.has_header("ETag"):
+            del response["ETag"]
+        return response
+    return inner
+
+# Model signals cover save() and delete(), including queryset deletes. Code that
+# changes rooms or players with update() or bulk writes calls bump_room_version_on_commit().
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def room_changed(sender, instance, **kwargs):
+    bump_room_version_on_commit(instance.code)
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def player_changed(sender, instance, **kwargs):
+    bump_room_version_on_commit(instance.roomCode)
@@ -6,13 +6,22 @@ from django.http import JsonResponse
 from django.http import HttpResponse
 from django.views import View
 from django.shortcuts import get_object_or_404
-from django.db.models import F, Q
+from django.utils.decorators import method_decorator
+from django.db import transaction, IntegrityError, OperationalError
+from django.conf import settings
+from django.db.models import F
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from .utils import validate_field, validate_amount_players, validate_integer_field, validate_name_field, setPlayerColor, setBracketsPosition, createTournamentMatches, update_players_list
-
-from .models import Room, roomTypes, RoomStatus, Match
+from .utils import validate_field, validate_amount_players, validate_integer_field, validate_name_field, pick_color, pick_bracket_position, occupy_slots, slot_bit, update_players_list, roster_change, join_room, release_seat, RoomFull, SlotTaken
+
+from .models import Room, roomTypes, RoomStatus, Match, TournamentBracket
+from .lobby import cached_lobby
+from .bracket import refresh_bracket
+from .versions import room_condition, roster_version
+from .status import room_status, wait_for_status
+from .keyset import keyset_page, approximate_count
+from .search import search_rooms
 from players.models import Player, playerColors, MatchPlayer
 
 logger = logging.getLogger(__name__)
@@ -25,12 +34,52 @@ class RoomGetView(View):
             current_page = 1
         page_size = int(request.GET.get('size', 10))
         filter_label = request.GET.get('filter', '')
+        ranked = request.GET.get('order') == 'relevance'
+
+        # `cursor` (empty for the first page) opts into keyset pagination.
+        if 'cursor' in request.GET:
+            # Cursors point into the (name, id) order, which a relevance ranking does not follow.
+            if ranked:
+                return JsonResponse({'errorCode': '400', 'message': 'order=relevance is not supported with cursor pagination'}, status=400)
+            cursor = request.GET.get('cursor', '')
+            with_total = request.GET.get('total') == 'approx'
+            try:
+                response = cached_lobby(
+                    "v1-cursor",
+                    {"cursor": cursor, "size": page_size, "filter": filter_label, "total": with_total},
+                    lambda: self.lobby_cursor_page(cursor, page_size, filter_label, with_total),
+                )
+            except ValueError as e:
+                return JsonResponse({'errorCode': '400', 'message': f'{e}'}, status=400)
+            return JsonResponse(response)
+
+        response = cached_lobby(
+            "v1",
+            {"page": current_page, "size": page_size, "filter": filter_label, "ranked": ranked},
+            lambda: self.lobby_page(current_page, page_size, filter_label, ranked),
+        )
+        return JsonResponse(response)
 
+    @staticmethod
+    def lobby_rooms(filter_label, ranked=False):
         rooms = Room.objects.filter(privateRoom=False, amountOfPlayers__lt=F('maxAmountOfPlayers'), status__lt=RoomStatus.READY_FOR_START.value).order_by('name')
         if filter_label:
-            rooms = rooms.filter(
-                Q(name__icontains=filter_label) | Q(code__icontains=filter_label)
-            )
+            rooms = search_rooms(rooms, filter_label, ranked)
+        return rooms
+
+    @staticmethod
+    def room_data(room):
+        return {
+            "roomCode": room.code,
+            "numberOfPlayers": room.amountOfPlayers,
+            "maxNumberOfPlayers": room.maxAmountOfPlayers,
+            "roomName": room.name,
+            "type": room.type,
+            "owner": "red"
+        }
+
+    def lobby_page(self, current_page, page_size, filter_label, ranked=False):
+        rooms = self.lobby_rooms(filter_label, ranked)
 
         paginator = Paginator(rooms, page_size)
         try:
@@ -40,19 +89,10 @@ class RoomGetView(View):
         except EmptyPage:
             paginated_rooms = paginator.page(paginator.num_pages)
 
-        data = [
-            {
-                "roomCode": room.code,
-                "numberOfPlayers": room.amountOfPlayers,
-                "maxNumberOfPlayers": room.maxAmountOfPlayers,
-                "roomName": room.name,
-                "type": room.type,
-                "owner": "red"
-            }
-            for room in paginated_rooms
-        ]
+        data = [self.room_data(room) for room in paginated_rooms]
 
-        total_items = rooms.count()
+        # The paginator already counted the rooms.
+        total_items = paginator.count
         total_pages = (total_items + page_size - 1) // page_size
 
         response = {
@@ -67,7 +107,22 @@ class RoomGetView(View):
             "totalItems": total_items
         }
 
-        return JsonResponse(response)
+        return response
+
+    def lobby_cursor_page(self, cursor, page_size, filter_label, with_total):
+        rooms = self.lobby_rooms(filter_label)
+        page = keyset_page(rooms, cursor, page_size)
+        response = {
+            "pageSize": page_size,
+            "nextCursor": page["next"],
+            "previousCursor": page["previous"],
+            "hasNextPage": page["next"] is not None,
+            "hasPreviousPage": page["previous"] is not None,
+            "content": [self.room_data(room) for room in page["items"]],
+        }
+        if with_total:
+            response["totalItems"], response["totalIsApproximate"] = approximate_count(rooms)
+        return response
 
 class CreateRoomView(View):
     def post(self, request, *args, **kwargs):
@@ -105,12 +160,12 @@ class CreateRoomView(View):
             name=created_by,
             roomId=new_room,
             roomCode=new_room.code,
-            profileColor=setPlayerColor(new_room.code),
+            profileColor=pick_color(new_room.colorSlots),
             urlProfileImage=f"/assets/img/{random.choice([1, 2])}.png"
         )
 
         if new_room.type == roomTypes.TOURNAMENT.value:
-            new_player.bracketsPosition = setBracketsPosition(new_room.code)
+            new_player.bracketsPosition = pick_bracket_position(new_room.bracketSlots, new_room.maxAmountOfPlayers)
             if new_player.bracketsPosition % 2 == 0:
                 new_player.profileColor = 0
             else:
@@ -119,6 +174,7 @@ class CreateRoomView(View):
 
         new_room.createdBy = new_player.id
         new_room.amountOfPlayers += 1
+        occupy_slots(new_room, new_player)
 
         if new_room.type == roomTypes.SINGLE_PLAYER.value:
             Player.objects.create(
@@ -128,9 +184,12 @@ class CreateRoomView(View):
                 profileColor=2,
                 urlProfileImage=f"/assets/img/{random.choice([1, 2])}.png"
             )
+            new_room.colorSlots |= slot_bit(2)
             new_room.maxAmountOfPlayers += 1
 
         new_room.save()
+        if new_room.type == roomTypes.TOURNAMENT.value:
+            refresh_bracket(new_room.id)
 
         return JsonResponse(
             {'roomCode': new_room.code,
@@ -143,6 +202,7 @@ class CreateRoomView(View):
             }
         )
 
+@method_decorator(room_condition, name='get')
 class RoomView(View):
     def delete(self, request, room_code):
         userId = request.headers.get("X-User-Id")
@@ -206,11 +266,13 @@ class RoomView(View):
                     'players': players_data,
                     'owner': user.name == room.createdBy,
                     'ownerColor': user.profileColor,
+                    'rosterVersion': roster_version(room.code),
                 }
             )
         except Room.DoesNotExist:
             return JsonResponse({'errorCode': '404', 'message': 'Room not found'}, status=404)
 
+@method_decorator(room_condition, name='get')
 class TournamentView(View):
     def get(self, request, room_code):
         try:
@@ -218,61 +280,49 @@ class TournamentView(View):
             if not userId or not room_code:
                 return JsonResponse({'errorCode': '400', 'message': 'Bad request'}, status=400)
 
-            room = Room.objects.get(code=room_code)
+            # Room and bracket snapshot in one read, however big the bracket.
+            room = Room.objects.select_related('bracket').get(code=room_code)
             if room is None or room.type != 1:
                 return JsonResponse({'errorCode': '400', 'message': 'Bad request'}, status=400)
 
-            user = Player.objects.filter(roomCode=room.code, id=userId).first()
-            if user is None:
+            try:
+                snapshot = room.bracket.snapshot
+            except TournamentBracket.DoesNotExist:
+                snapshot = refresh_bracket(room.id).snapshot
+
+            members = snapshot.get('members', {})
+            if userId not in members:
                 return JsonResponse({'errorCode': '403', 'message': 'Forbidden'}, status=403)
-            players_data = {}
+            seated = snapshot.get('players', {})
             matchsCount = room.maxAmountOfPlayers // 2 ** (room.stage - 1)
-            total_positions = matchsCount * 2
             num_players = room.amountOfPlayers
             if room.stage == 1:
-                for i in range(1, matchsCount + 1):
-                    player = Player.objects.filter(roomCode=room.code, bracketsPosition=i).first()
-                    if player:
-                        players_data[i] = {
-                            "name": player.name,
-                            "urlProfileImage": player.urlProfileImage,
-                            "color": player.profileColor,
-                            "you": True if user.id == player.id else False,
-                        }
-                    else:
-                        players_data[i] = None
+                players_data = {
+                    i: {
+                        "name": player["name"],
+                        "urlProfileImage": player["urlProfileImage"],
+                        "color": player["color"],
+                        "you": userId == player["id"],
+                    } if player else None
+                    for i, player in ((i, seated.get(str(i))) for i in range(1, matchsCount + 1))
+                }
             elif room.stage == 0:
                 players_data = {}
                 matchsCount = 0
                 num_players = 0
             else:
-                players_info = {}
-                for match in Match.objects.filter(room=room, status=1).all():
-                    matchPlayers = MatchPlayer.objects.filter(match=match).select_related("player").all()
-
-                    if matchPlayers.count() == 0:
-                        return JsonResponse({'errorCode': '404', 'message': 'Match not found'}, status=404)
-                    if matchPlayers.count() != 2:
-                        return JsonResponse({'errorCode': '400', 'message': 'Match not filled'}, status=400)
-                    players = [matchPlayer.player for matchPlayer in matchPlayers]
-                    for player in players:
-                        players_info[player.bracketsPosition] = {
-                            "name": player.name,
-                            "urlProfileImage": player.urlProfileImage,
-                            "color": player.profileColor
-                        }
-
                 players_data = {
-                    position: players_info.get(position, None)
-                    for position in range(1, matchsCount + 1)
+                    i: {
+                        "name": player["name"],
+                        "urlProfileImage": player["urlProfileImage"],
+                        "color": player["color"]
+                    } if player else None
+                    for i, player in ((i, seated.get(str(i))) for i in range(1, matchsCount + 1))
                 }
-
                 num_players = matchsCount
 
-                matches = Match.objects.filter(room=room, stage=room.stage)
-
             owner = False
-            if user.bracketsPosition % 2 != 0:
+            if members[userId] % 2 != 0:
                 owner = True
 
             return JsonResponse(
@@ -289,24 +339,42 @@ class TournamentView(View):
                     'createdBy': room.createdBy,
                     'players': players_data,
                     'owner': owner,
-                    'tournamentOwner': user.id == room.createdBy,
+                    'tournamentOwner': userId == room.createdBy,
                     'matchsCount': matchsCount,
-                    #TODO: O ERRO DOS VENCEDORES PODE ESTAR AQUI
-                    'winner': True if Match.objects.filter(room=room, winner=userId).exists() else False
+                    'winner': userId in snapshot.get('winners', [])
                 }
             )
         except Room.DoesNotExist:
             return JsonResponse({'errorCode': '404', 'message': 'Room not found'}, status=404)
 
+@method_decorator(room_condition, name='get')
 class RoomStatusView(View):
     def get(self, request, room_code):
         if not room_code:
             return JsonResponse({'errorCode': '400', 'message': 'Bad Request'}, status=404)
+        entry = room_status(room_code)
+        if entry is None:
+            return JsonResponse({'errorCode': '404', 'message': 'Room status not found'}, status=404)
+        return JsonResponse({'status': str(entry['status'])})
+
+class RoomStatusWatchView(View):
+    """
+    Long-poll for RoomStatusView: `?since=<version>` holds the request until the
+    status moves past that version (200) or `timeout` seconds pass (304).
+    Without `since` it answers at once with the current status and version.
+    """
+    async def get(self, request, room_code):
         try:
-            room = Room.objects.get(code=room_code)
-            return JsonResponse({'status': str(room.status)})
-        except Room.DoesNotExist:
+            timeout = min(float(request.GET.get('timeout', settings.ROOM_STATUS_WATCH_TIMEOUT)), settings.ROOM_STATUS_WATCH_TIMEOUT)
+        except ValueError:
+            return JsonResponse({'errorCode': '400', 'message': 'Bad Request'}, status=400)
+
+        entry, changed = await wait_for_status(room_code, request.GET.get('since'), max(timeout, 0))
+        if entry is None:
             return JsonResponse({'errorCode': '404', 'message': 'Room status not found'}, status=404)
+        if not changed:
+            return HttpResponse(status=304)
+        return JsonResponse({'status': str(entry['status']), 'version': str(entry['version'])})
 
 class AddPlayerToRoomView(View):
     def put(self, request, room_code):
@@ -331,31 +399,18 @@ class AddPlayerToRoomView(View):
             if room is None:
                 return JsonResponse({'errorCode': '403', 'message': 'Room dont exist.'}, status=403)
 
-            if room.players.count() >= room.maxAmountOfPlayers:
+            try:
+                player = join_room(room, player_name)
+            except RoomFull:
                 return JsonResponse({'errorCode': '403', 'message': 'Room is full'}, status=403)
-
-            player = Player.objects.create(
-                name=player_name,
-                roomCode=room_code,
-                roomId=room,
-                profileColor=setPlayerColor(room.code),
-                urlProfileImage=f"/assets/img/{random.choice([1, 2])}.png"
-            )
-
-            if room.type == roomTypes.TOURNAMENT.value:
-                player.bracketsPosition = setBracketsPosition(room.code)
-                if player.bracketsPosition % 2 == 0:
-                    player.profileColor = 1
-                else:
-                    player.profileColor = 0
-                player.save()
-
-            room.amountOfPlayers += 1
-            room.save()
-            update_players_list(room_code, "")
-
-            if room.stage == 1 and room.type == roomTypes.TOURNAMENT.value and room.amountOfPlayers == room.maxAmountOfPlayers:
-                createTournamentMatches(room)
+            except (SlotTaken, IntegrityError) as e:
+                # Every retry lost its seat to another joiner; the room may still have room.
+                logger.warning(f"Warn | AddPlayerToRoomView | put | Room {room_code} | {e}")
+                return JsonResponse({'errorCode': '409', 'message': 'Seat taken, try again'}, status=409, headers={'Retry-After': '1'})
+            except OperationalError as e:
+                logger.error(f"Error | AddPlayerToRoomView | put | Room {room_code} | {e}")
+                return JsonResponse({'errorCode': '503', 'message': 'Room is busy, try again'}, status=503, headers={'Retry-After': '1'})
+            update_players_list(room_code, "", [roster_change("added", player, room)])
 
             return JsonResponse(
                 {
@@ -400,11 +455,14 @@ class RemovePlayerView(View):
         except Player.DoesNotExist:
             return JsonResponse({"errorCode": "404", "message": "Player not found in the room"}, status=404)
 
-        update_players_list(room_code, player.profileColor)
+        with transaction.atomic():
+            player.delete()
+            release_seat(room, player)
+            if room.type == roomTypes.TOURNAMENT.value:
+                refresh_bracket(room.id)
 
-        player.delete()
-        room.amountOfPlayers -= 1
-        room.save()
+        # After the commit, so clients refetching on the event no longer see the player.
+        update_players_list(room_code, player.profileColor, [roster_change("removed", player, room)])
 
         return HttpResponse(
             status=204,
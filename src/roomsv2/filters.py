@@ -0,0 +1,18 @@
+from rest_framework.filters import SearchFilter
+from rooms.search import search_rooms, relevance
+
+class RoomSearchFilter(SearchFilter):
+    """
+    `?search=` over room name and code with SearchFilter's semantics (every term
+    must be contained in one of them), through rooms.search so it uses the trigram
+    indexes. `?order=relevance` ranks the results.
+    """
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        for term in terms:
+            queryset = search_rooms(queryset, term)
+        if request.query_params.get('order') == 'relevance':
+            queryset = queryset.annotate(relevance=relevance(" ".join(terms))).order_by("-relevance", "name", "id")
+        return queryset
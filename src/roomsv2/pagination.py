@@ -1,6 +1,8 @@
 # myapp/pagination.py
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rooms.keyset import keyset_page, approximate_count
 
 class CustomRoomPagination(PageNumberPagination):
     page_size_query_param = 'size'
@@ -24,4 +26,47 @@ class CustomRoomPagination(PageNumberPagination):
             'totalPages': total_pages,
             'content': data,
             'totalItems': total_items
-        })
\ No newline at end of file
+        })
+
+class CursorRoomPagination(BasePagination):
+    """
+    Keyset pagination over (name, id), opted into with `?cursor=` (empty for the
+    first page). Pages cost one range query however deep the client scrolls;
+    `?total=approx` adds the planner's row estimate instead of a COUNT.
+    """
+    page_size_query_param = 'size'
+    max_page_size = 10
+    page_size = 10
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        # Cursors point into the (name, id) order, which a relevance ranking does not follow.
+        if request.query_params.get('order') == 'relevance':
+            raise ValidationError({'order': 'order=relevance is not supported with cursor pagination'})
+        self.size = self.get_page_size(request)
+        try:
+            self.page = keyset_page(queryset, request.query_params.get('cursor', ''), self.size)
+        except ValueError as e:
+            raise ValidationError({'cursor': str(e)})
+        self.total = approximate_count(queryset) if request.query_params.get('total') == 'approx' else None
+        return self.page['items']
+
+    def get_paginated_response(self, data):
+        response = {
+            'pageSize': self.size,
+            'nextCursor': self.page['next'],
+            'previousCursor': self.page['previous'],
+            'hasNextPage': self.page['next'] is not None,
+            'hasPreviousPage': self.page['previous'] is not None,
+            'content': data,
+        }
+        if self.total is not None:
+            response['totalItems'], response['totalIsApproximate'] = self.total
+        return Response(response)
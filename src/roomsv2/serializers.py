@@ -1,11 +1,13 @@
 from rest_framework import serializers
 from rooms.models import Room, roomTypes, RoomStatus
 from players.models import Player
-from rooms.utils import setPlayerColor, setBracketsPosition
+from rooms.utils import pick_color, pick_bracket_position, occupy_slots, slot_bit
+from rooms.bracket import refresh_bracket
+from rooms.versions import roster_version
 import random
 
 
-class RoomSerializer(serializers.ModelSerializer):
+class LobbyRoomSerializer(serializers.ModelSerializer):
     roomCode = serializers.CharField(source='code', read_only=True)
     numberOfPlayers = serializers.IntegerField(source='amountOfPlayers', read_only=True)
     maxNumberOfPlayers = serializers.IntegerField(source='maxAmountOfPlayers', read_only=True)
@@ -79,12 +81,12 @@ class RoomCreateSerializer(serializers.ModelSerializer):
             userId=jwt_user_id,
             roomId=room,
             roomCode=room.code,
-            profileColor=setPlayerColor(room.code),
+            profileColor=pick_color(room.colorSlots),
             urlProfileImage=f"/assets/img/{random.choice([1, 2])}.png"
         )
 
         if room_type == roomTypes.TOURNAMENT.value:
-            new_player.bracketsPosition = setBracketsPosition(room.code)
+            new_player.bracketsPosition = pick_bracket_position(room.bracketSlots, room.maxAmountOfPlayers)
             if new_player.bracketsPosition % 2 == 0:
                 new_player.profileColor = 1
             else:
@@ -93,6 +95,7 @@ class RoomCreateSerializer(serializers.ModelSerializer):
 
         room.createdBy = new_player.name
         room.amountOfPlayers += 1
+        occupy_slots(room, new_player)
 
         if room_type == roomTypes.SINGLE_PLAYER.value:
             Player.objects.create(
@@ -103,9 +106,12 @@ class RoomCreateSerializer(serializers.ModelSerializer):
                 profileColor=2,
                 urlProfileImage=f"/assets/img/{random.choice([1, 2])}.png"
             )
+            room.colorSlots |= slot_bit(2)
             room.maxAmountOfPlayers += 1
 
         room.save()
+        if room_type == roomTypes.TOURNAMENT.value:
+            refresh_bracket(room.id)
 
         return room
 
@@ -140,13 +146,14 @@ class RoomSerializer(serializers.ModelSerializer):
     amountOfPlayers = serializers.SerializerMethodField()
     owner = serializers.BooleanField(source='is_owner_user', read_only=True)  # Assumindo is_owner_user no view
     ownerColor = serializers.SerializerMethodField()
+    rosterVersion = serializers.SerializerMethodField()
 
     class Meta:
         model = Room
         fields = [
             'roomId', 'roomType', 'roomCode', 'roomName',
             'maxAmountOfPlayers', 'amountOfPlayers', 'players',
-            'owner', 'ownerColor'
+            'owner', 'ownerColor', 'rosterVersion'
         ]
         # Mapeie os campos do seu modelo para os nomes do JSON de saída, se necessário
         # Ex: room_id no JSON de saída para o campo 'id' do modelo
@@ -191,4 +198,8 @@ class RoomSerializer(serializers.ModelSerializer):
             owner_player = Player.objects.get(id=obj.createdBy, roomCode=obj.code)
             return owner_player.profileColor
         except Player.DoesNotExist:
-            return None  # Ou um valor padrão/erro
\ No newline at end of file
+            return None  # Ou um valor padrão/erro
+
+    def get_rosterVersion(self, obj):
+        # Baseline for the player_list_update deltas, see rooms.utils.update_players_list
+        return roster_version(obj.code)
@@ -2,24 +2,27 @@ from rest_framework import viewsets
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView, CreateAPIView
 from rest_framework.response import Response
-from rest_framework.filters import SearchFilter
 from django.db.models import Q, F
+from django.utils.decorators import method_decorator
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.renderers import JSONRenderer
 from rooms.models import Room, RoomStatus
 from players.models import Player
-from .serializers import RoomSerializer, RoomCreateSerializer
-from .pagination import CustomRoomPagination
+from .serializers import RoomSerializer, LobbyRoomSerializer, RoomCreateSerializer
+from .pagination import CustomRoomPagination, CursorRoomPagination
+from .filters import RoomSearchFilter
+from rooms.lobby import cached_lobby
+from rooms.versions import room_condition
 
 class RoomViewSet(viewsets.ModelViewSet):
     queryset = Room.objects.all()
     serializer_class = RoomSerializer
 
 class RoomGetAPIView(ListAPIView):
-    serializer_class = RoomSerializer
+    serializer_class = LobbyRoomSerializer
     pagination_class = CustomRoomPagination
-    filter_backends = [SearchFilter]
+    filter_backends = [RoomSearchFilter]
     renderer_classes = [JSONRenderer]
 
     search_fields = ['name', 'code']
@@ -33,6 +36,21 @@ class RoomGetAPIView(ListAPIView):
 
         return queryset
 
+    @property
+    def paginator(self):
+        # `?cursor=` switches the lobby to keyset pagination.
+        if not hasattr(self, '_paginator'):
+            self._paginator = CursorRoomPagination() if 'cursor' in self.request.query_params else self.pagination_class()
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        data = cached_lobby(
+            "v2",
+            dict(request.query_params.items()),
+            lambda: super(RoomGetAPIView, self).list(request, *args, **kwargs).data,
+        )
+        return Response(data)
+
 
 class CreateRoomAPIView(CreateAPIView):
     queryset = Room.objects.all()
@@ -60,6 +78,7 @@ class CreateRoomAPIView(CreateAPIView):
 
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=custom_headers)
 
+@method_decorator(room_condition, name='get')
 class RoomDetailView(APIView):
     # Se você tiver autenticação e permissões configuradas no settings.py,
     # elas serão aplicadas automaticamente aqui.
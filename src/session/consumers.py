@@ -7,6 +7,7 @@ from players.models import MatchPlayer, Player
 from asgiref.sync import sync_to_async
 from .repository import SessionRepository
 from rooms.utils import update_players_list
+from worker.listeners.presence import PRESENCE_GROUP
 
 class RoomConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -38,6 +39,7 @@ class RoomConsumer(AsyncWebsocketConsumer):
             logging.info(f"{RoomConsumer.__name__} | User {self.user_id} connected to queue room_{self.room_name}_{match.id}")
 
         await self.repository.update_player_connected_status(self.user_id, True)
+        await self.channel_layer.group_send(PRESENCE_GROUP, {"type": "player.connected", "playerId": self.user_id})
         await self.accept()
 
     async def disconnect(self, close_code):
@@ -56,10 +58,13 @@ class RoomConsumer(AsyncWebsocketConsumer):
         self.repository.update_player_connected_status(self.user_id, True)
 
     async def player_list_update(self, event):
-        user_removed = event["userRemoved"]
+        # Already coalesced per room by update_players_list, so forwarded as is.
         await self.send(text_data=json.dumps({
             "type": "player_list_update",
-            "userRemoved": user_removed,
+            "userRemoved": event["userRemoved"],
+            "changes": event.get("changes", []),
+            "since": event.get("since"),
+            "version": event.get("version"),
         }))
 
     async def delete_room(self, event):
@@ -89,6 +94,9 @@ class RoomConsumer(AsyncWebsocketConsumer):
     async def tournament_ended(self, event):
         await self.send(text_data=json.dumps(event))
 
+    async def room_status(self, event):
+        await self.send(text_data=json.dumps(event))
+
 class PlayerScoreConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_code']
@@ -0,0 +1,70 @@
+import json
+import redis
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class ProducerUnavailable(Exception):
+    """Redis did not take the message in time; nothing was queued."""
+
+class RedisProducer:
+    """
+    Pushes JSON messages to Redis lists for the other services. Connections come
+    from a bounded pool with short socket, connect and pool timeouts, so a slow
+    Redis fails the push within about a second instead of holding the request.
+    """
+    def __init__(self, host=None, port=None, socket_timeout=None, connect_timeout=None, max_connections=None):
+        self.host = host or settings.REDIS_HOST
+        self.port = port or settings.REDIS_PORT
+        self.socket_timeout = socket_timeout or settings.REDIS_SOCKET_TIMEOUT
+        self.connect_timeout = connect_timeout or settings.REDIS_CONNECT_TIMEOUT
+        self.max_connections = max_connections or settings.REDIS_MAX_CONNECTIONS
+        self._client = None
+
+    def _pool_options(self):
+        return {
+            "host": self.host,
+            "port": self.port,
+            "db": 0,
+            "decode_responses": True,
+            "socket_timeout": self.socket_timeout,
+            "socket_connect_timeout": self.connect_timeout,
+            "max_connections": self.max_connections,
+            # Wait at most this long for a free connection before giving up.
+            "timeout": self.socket_timeout,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis(connection_pool=redis.BlockingConnectionPool(**self._pool_options()))
+        return self._client
+
+    @staticmethod
+    def _batches(batch):
+        """`batch` is an iterable of (queue, message) pairs; messages for the same queue share one RPUSH."""
+        queues = {}
+        for queue, message in batch:
+            queues.setdefault(queue, []).append(json.dumps(message))
+        return queues
+
+    def push(self, queue, *messages):
+        return self.push_many((queue, message) for message in messages)
+
+    def push_many(self, batch):
+        queues = self._batches(batch)
+        if not queues:
+            return 0
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for queue, messages in queues.items():
+                    pipe.rpush(queue, *messages)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Error | {RedisProducer.__name__} | push | {', '.join(queues)} | {e}")
+            raise ProducerUnavailable(str(e)) from e
+        return sum(len(messages) for messages in queues.values())
+
+producer = RedisProducer()
@@ -127,6 +127,56 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Redis producer (session/producer.py) and the games outbox relay (python manage.py relay_outbox)
+
+REDIS_HOST = os.environ.get("REDIS_HOST", "redis")                           # The compose service the game service reads GAME_CREATE_QUEUE from
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", 0.5))    # Seconds a command may take before it fails
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", 0.5))  # Seconds to open a connection
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 20))     # Pool size per process
+GAME_CREATE_QUEUE = os.environ.get("GAME_CREATE_QUEUE", "create-game-queue")
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", 100))            # Outbox rows published per round trip (relay_outbox)
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 0.2))    # Seconds relay_outbox sleeps once the outbox is empty
+GAME_CREATE_TIMEOUT = float(os.environ.get("GAME_CREATE_TIMEOUT", 60))      # Seconds before a match still waiting for its game may be requested again
+
+# Cache (the lobby listing in rooms/lobby.py). Lookups fail open when Redis is down.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/1",
+        "OPTIONS": {
+            "socket_timeout": REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        },
+    },
+}
+LOBBY_CACHE_TTL = int(os.environ.get("LOBBY_CACHE_TTL", 30))       # Seconds a lobby page stays cached between invalidations
+LOBBY_LOCAL_SIZE = int(os.environ.get("LOBBY_LOCAL_SIZE", 256))    # Lobby pages kept in each process
+ROOM_VERSION_TTL = int(os.environ.get("ROOM_VERSION_TTL", 86400))  # Seconds an idle room keeps its cached version and status
+ROOM_STATUS_WATCH_TIMEOUT = float(os.environ.get("ROOM_STATUS_WATCH_TIMEOUT", 25))  # Longest a status watch request is parked
+PLAYER_LIST_UPDATE_WINDOW = int(os.environ.get("PLAYER_LIST_UPDATE_WINDOW", 1))  # Seconds update_players_list buffers a room's roster changes into one event (0 sends every one)
+
+# Game integration worker (python manage.py game_integration)
+
+GAME_SYNC_QUEUE = os.environ.get("GAME_SYNC_QUEUE", "game-sync-session-queue")
+GAME_SYNC_BATCH_SIZE = int(os.environ.get("GAME_SYNC_BATCH_SIZE", 100))      # Max messages drained per round trip
+GAME_SYNC_BLOCK_TIMEOUT = int(os.environ.get("GAME_SYNC_BLOCK_TIMEOUT", 5))  # Seconds BLPOP waits before re-polling
+GAME_SYNC_CONCURRENCY = int(os.environ.get("GAME_SYNC_CONCURRENCY", 8))      # Matches processed in parallel
+GAME_SYNC_SHARD_QUEUE_SIZE = int(os.environ.get("GAME_SYNC_SHARD_QUEUE_SIZE", 100))
+GAME_SYNC_VISIBILITY_TIMEOUT = int(os.environ.get("GAME_SYNC_VISIBILITY_TIMEOUT", 60))  # Seconds before an unacked message is redelivered
+GAME_SYNC_MAX_ATTEMPTS = int(os.environ.get("GAME_SYNC_MAX_ATTEMPTS", 5))  # Deliveries before a message is dead-lettered
+# "list" runs a single worker on the queue; "stream" lets several workers share it through partitioned Redis Streams.
+GAME_SYNC_MODE = os.environ.get("GAME_SYNC_MODE", "list")
+GAME_SYNC_PARTITIONS = int(os.environ.get("GAME_SYNC_PARTITIONS", 16))
+GAME_SYNC_LEASE_TIMEOUT = int(os.environ.get("GAME_SYNC_LEASE_TIMEOUT", 15))  # Seconds before a dead worker's partitions are taken over
+GAME_SYNC_PRESENCE_TIMEOUT = int(os.environ.get("GAME_SYNC_PRESENCE_TIMEOUT", 300))  # Seconds to wait for both players before syncing a match
+GAME_SYNC_DEDUP_TTL = int(os.environ.get("GAME_SYNC_DEDUP_TTL", 3600))  # Seconds a processed eventId is remembered
+GAME_SYNC_DEDUP_LOCAL_SIZE = int(os.environ.get("GAME_SYNC_DEDUP_LOCAL_SIZE", 10000))
+GAME_SYNC_STATS_INTERVAL = int(os.environ.get("GAME_SYNC_STATS_INTERVAL", 60))  # Seconds between stats log lines, 0 disables
+GAME_SYNC_METRICS_HOST = os.environ.get("GAME_SYNC_METRICS_HOST", "0.0.0.0")
+GAME_SYNC_METRICS_PORT = int(os.environ.get("GAME_SYNC_METRICS_PORT", 0))  # Prometheus scrape endpoint, 0 disables
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -0,0 +1,174 @@
+import json
+import time
+import uuid
+import asyncio
+import statistics
+
+from collections import Counter
+from asgiref.sync import sync_to_async
+from rooms.models import Room, Match
+from rooms.utils import createTournamentMatches
+from rooms.bracket import refresh_bracket
+from players.models import Player
+from .listeners.orchestrator_listerner import OrchestratorListener
+
+try:
+    import fakeredis
+except ImportError:  # requirements-dev.txt
+    fakeredis = None
+
+class MeasuredQueue:
+    """
+    Wraps the listener's real queue and records how long each delivery took from
+    `fetch` until it was acked, failed or dead-lettered.
+    """
+    def __init__(self, queue):
+        self.queue = queue
+        self.in_flight = {}
+        self.latencies = []
+        self.outcomes = Counter()
+
+    def __getattr__(self, name):
+        return getattr(self.queue, name)
+
+    async def fetch(self, batch_size, block_timeout):
+        deliveries = await self.queue.fetch(batch_size, block_timeout)
+        now = time.perf_counter()
+        for delivery in deliveries:
+            self.in_flight[delivery.receipt] = now
+        return deliveries
+
+    def _done(self, delivery, outcome):
+        self.latencies.append(time.perf_counter() - self.in_flight.pop(delivery.receipt))
+        self.outcomes[outcome] += 1
+
+    async def ack(self, delivery):
+        await self.queue.ack(delivery)
+        self._done(delivery, "acked")
+
+    async def fail(self, delivery, error):
+        await self.queue.fail(delivery, error)
+        self._done(delivery, "failed")
+
+    async def dead_letter(self, delivery, error, attempts=None):
+        await self.queue.dead_letter(delivery, error, attempts)
+        self._done(delivery, "dead_lettered")
+
+def seed_rooms(rooms, players):
+    """Creates `rooms` full tournament rooms of `players` connected players, with their brackets and snapshots."""
+    seeded = []
+    for i in range(rooms):
+        room = Room.objects.create(name=f"Benchmark {i}", maxAmountOfPlayers=players, amountOfPlayers=players, type=1, status=11)
+        Player.objects.bulk_create([
+            Player(
+                id=str(uuid.uuid4()),
+                userId=str(uuid.uuid4()),
+                name=f"Player {position}",
+                roomId=room,
+                roomCode=room.code,
+                isConnected=True,
+                bracketsPosition=position,
+            )
+            for position in range(1, players + 1)
+        ])
+        createTournamentMatches(room)
+        refresh_bracket(room.id)
+        seeded.append(room)
+    return seeded
+
+def generate_stages(rooms):
+    """
+    Event streams for every stage of every room, as the game service would send
+    them: `game-created`, `game-started` and `game-over` per match, with the lower
+    bracket position always winning. Rooms are interleaved so consecutive events
+    belong to different matches.
+    """
+    brackets = []
+    for room in rooms:
+        matches = {}
+        for match in Match.objects.filter(room=room).order_by("stage", "position"):
+            matches.setdefault(match.stage, []).append(match)
+        seeds = list(Player.objects.filter(roomId=room).order_by("bracketsPosition").values_list("id", flat=True))
+        brackets.append((matches, seeds))
+
+    stages = []
+    for stage in range(1, max((len(matches) for matches, _ in brackets), default=0) + 1):
+        per_room = []
+        for i, (matches, seeds) in enumerate(brackets):
+            events = []
+            winners = []
+            for match, (winner, loser) in zip(matches.get(stage, []), zip(seeds[::2], seeds[1::2])):
+                events += [
+                    {"eventId": f"{match.id}:created", "type": "game-created", "matchId": match.id, "gameId": str(uuid.uuid4())},
+                    {"eventId": f"{match.id}:started", "type": "game-started", "matchId": match.id},
+                    {
+                        "eventId": f"{match.id}:over",
+                        "type": "game-over",
+                        "matchId": match.id,
+                        "winner": winner,
+                        "players": [{"id": winner, "rank": 1}, {"id": loser, "rank": 2}],
+                    },
+                ]
+                winners.append(winner)
+            brackets[i] = (matches, winners)
+            per_room.append(events)
+        stages.append([json.dumps(event) for events in interleave(per_room) for event in events])
+    return stages
+
+def interleave(streams):
+    """Round-robin over several event lists, keeping each list's own order."""
+    for position in range(max((len(stream) for stream in streams), default=0)):
+        yield [stream[position] for stream in streams if position < len(stream)]
+
+async def run_benchmark(rooms=10, players=8, concurrency=None, batch_size=None, mode="list"):
+    """
+    Replays the generated events through the worker's real queue (`list` or
+    `stream` mode), backed by an in-process fakeredis server instead of Redis.
+    """
+    if fakeredis is None:
+        raise RuntimeError("The game sync benchmark needs fakeredis[lua] (requirements-dev.txt).")
+    rooms = await sync_to_async(seed_rooms)(rooms, players)
+    stages = await sync_to_async(generate_stages)(rooms)
+
+    client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    listener = OrchestratorListener(batch_size=batch_size, block_timeout=0.01, concurrency=concurrency, mode=mode, client=client)
+    queue = listener.queue = MeasuredQueue(listener.queue)
+    await queue.recover()
+    listener.dispatcher.start()
+    start = time.perf_counter()
+    try:
+        # A stage only starts once the previous one is fully applied, like the real tournament.
+        for messages in stages:
+            await client.rpush(listener.queue_name, *messages)
+            if mode == "stream":
+                await queue.route(block_timeout=0.01)
+            while deliveries := await listener.fetch_batch():
+                for delivery in deliveries:
+                    await listener.dispatcher.submit(listener.match_key(delivery.message), delivery)
+            await listener.dispatcher.join()
+            await asyncio.gather(*listener.sync_tasks)
+        elapsed = time.perf_counter() - start
+    finally:
+        await listener.dispatcher.stop()
+
+    events = len(queue.latencies)
+    latencies = sorted(queue.latencies)
+    queries = sum(listener.metrics.db_queries.values())
+    return {
+        "mode": mode,
+        "rooms": len(rooms),
+        "players": players,
+        "events": events,
+        "outcomes": dict(queue.outcomes),
+        "seconds": elapsed,
+        "events_per_second": events / elapsed if elapsed else 0,
+        "p50": statistics.median(latencies) if latencies else 0,
+        "p99": latencies[min(events - 1, int(events * 0.99))] if latencies else 0,
+        "queries": queries,
+        "queries_per_event": queries / events if events else 0,
+        "queries_by_type": {
+            event_type: listener.metrics.db_queries[event_type] / listener.metrics.latency[event_type].count
+            for event_type in listener.metrics.db_queries
+        },
+        "max_queries_by_type": dict(listener.metrics.db_queries_max),
+    }
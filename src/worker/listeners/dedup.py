@@ -0,0 +1,61 @@
+import time
+import hashlib
+import logging
+
+from collections import OrderedDict
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+class EventDeduplicator:
+    """
+    Remembers processed event IDs for `ttl` seconds: in a local LRU bounded to
+    `local_size` entries, and in Redis (`<prefix>:<event id>` keys with a TTL) so
+    the window survives restarts and is shared between workers. Both lookups are
+    O(1). Redis errors never block processing; the local window still applies.
+    """
+    def __init__(self, client, prefix, ttl=3600, local_size=10000):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local_size = local_size
+        self._local = OrderedDict()
+
+    @staticmethod
+    def event_id(data, message):
+        """Producers should send `eventId`; redeliveries of the same payload hash to the same ID otherwise."""
+        return str(data.get("eventId") or hashlib.sha1(message.encode()).hexdigest())
+
+    def _seen_locally(self, event_id):
+        expires_at = self._local.get(event_id)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._local[event_id]
+            return False
+        self._local.move_to_end(event_id)
+        return True
+
+    def _remember(self, event_id):
+        self._local[event_id] = time.monotonic() + self.ttl
+        self._local.move_to_end(event_id)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def seen(self, event_id):
+        if self._seen_locally(event_id):
+            return True
+        try:
+            if await self.client.exists(f"{self.prefix}:{event_id}"):
+                self._remember(event_id)
+                return True
+        except RedisError as e:
+            logger.error(f"Error | {EventDeduplicator.__name__} | seen | {e}")
+        return False
+
+    async def mark(self, event_id):
+        self._remember(event_id)
+        try:
+            await self.client.set(f"{self.prefix}:{event_id}", 1, ex=self.ttl)
+        except RedisError as e:
+            logger.error(f"Error | {EventDeduplicator.__name__} | mark | {e}")
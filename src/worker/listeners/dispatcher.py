@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+class MatchDispatcher:
+    """
+    Runs a handler over a fixed pool of shard workers. Messages with the same key
+    always land on the same shard, so events for one match keep their order while
+    different matches are handled concurrently.
+    """
+    def __init__(self, handler, concurrency, queue_size=100):
+        self.handler = handler
+        self.shards = [asyncio.Queue(maxsize=queue_size) for _ in range(max(1, concurrency))]
+        self.workers = []
+
+    def start(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._run(shard)) for shard in self.shards]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def shard_for(self, key):
+        return zlib.crc32(str(key).encode()) % len(self.shards)
+
+    async def submit(self, key, message):
+        # Blocks when the shard is full, which stops the listener from pulling more work.
+        await self.shards[self.shard_for(key)].put(message)
+
+    async def join(self):
+        await asyncio.gather(*(shard.join() for shard in self.shards))
+
+    async def _run(self, shard):
+        while True:
+            message = await shard.get()
+            try:
+                await self.handler(message)
+            except Exception as e:
+                logger.exception(f"Error | {MatchDispatcher.__name__} | _run | {e}")
+            finally:
+                shard.task_done()
@@ -0,0 +1,15 @@
+import time
+
+class QueryCounter:
+    """`connection.execute_wrapper` hook that counts and times the queries run inside it."""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
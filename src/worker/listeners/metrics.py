@@ -0,0 +1,142 @@
+import time
+import asyncio
+import logging
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (None past the last bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+class EventTimer:
+    def __init__(self):
+        self.outcome = "ok"
+        self.queries = None
+
+    def db(self, queries):
+        self.queries = queries
+
+class WorkerMetrics:
+    """
+    In-process metrics for the game integration worker. `serve` exposes them in the
+    Prometheus text format; `snapshot` is what the periodic stats log prints.
+    """
+    def __init__(self):
+        self.events = Counter()
+        self.latency = defaultdict(Histogram)
+        self.db_time = defaultdict(Histogram)
+        self.db_queries = Counter()
+        self.db_queries_max = Counter()
+        self.gauges = {}
+
+    @contextmanager
+    def event(self, event_type):
+        timer = EventTimer()
+        start = time.perf_counter()
+        try:
+            yield timer
+        except Exception:
+            if timer.outcome == "ok":
+                timer.outcome = "error"
+            raise
+        finally:
+            self.events[(event_type, timer.outcome)] += 1
+            self.latency[event_type].observe(time.perf_counter() - start)
+            if timer.queries is not None:
+                self.db_time[event_type].observe(timer.queries.duration)
+                self.db_queries[event_type] += timer.queries.count
+                self.db_queries_max[event_type] = max(self.db_queries_max[event_type], timer.queries.count)
+
+    def set_gauges(self, **values):
+        self.gauges.update(values)
+
+    def snapshot(self):
+        return {
+            "gauges": dict(self.gauges),
+            "events": {f"{event_type}:{outcome}": count for (event_type, outcome), count in self.events.items()},
+            "latency": {
+                event_type: {"count": h.count, "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                for event_type, h in self.latency.items()
+            },
+            "dbTime": {
+                event_type: {
+                    "p50": h.quantile(0.5),
+                    "p99": h.quantile(0.99),
+                    "queries": self.db_queries[event_type],
+                    "maxQueries": self.db_queries_max[event_type],
+                }
+                for event_type, h in self.db_time.items()
+            },
+        }
+
+    def render(self):
+        lines = []
+        for name, value in self.gauges.items():
+            if value is not None:
+                lines += [f"# TYPE game_sync_{name} gauge", f"game_sync_{name} {value}"]
+        lines.append("# TYPE game_sync_events_total counter")
+        for (event_type, outcome), count in self.events.items():
+            lines.append(f'game_sync_events_total{{type="{event_type}",outcome="{outcome}"}} {count}')
+        lines.append("# TYPE game_sync_db_queries_total counter")
+        for event_type, count in self.db_queries.items():
+            lines.append(f'game_sync_db_queries_total{{type="{event_type}"}} {count}')
+        for metric, histograms in (("event_duration_seconds", self.latency), ("db_duration_seconds", self.db_time)):
+            lines.append(f"# TYPE game_sync_{metric} histogram")
+            for event_type, h in histograms.items():
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'game_sync_{metric}_bucket{{type="{event_type}",le="{bound}"}} {cumulative}')
+                lines.append(f'game_sync_{metric}_bucket{{type="{event_type}",le="+Inf"}} {h.count}')
+                lines.append(f'game_sync_{metric}_sum{{type="{event_type}"}} {h.sum}')
+                lines.append(f'game_sync_{metric}_count{{type="{event_type}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host, port, collect):
+        """Minimal HTTP endpoint: any request gets the current metrics after `collect()` refreshes the gauges."""
+        async def handle(reader, writer):
+            try:
+                await reader.readuntil(b"\r\n\r\n")
+                await collect()
+                body = self.render().encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                    + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+            except Exception as e:
+                logger.error(f"Error | {WorkerMetrics.__name__} | serve | {e}")
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        logger.info(f"{WorkerMetrics.__name__} | serving metrics on {host}:{port}")
+        async with server:
+            await server.serve_forever()
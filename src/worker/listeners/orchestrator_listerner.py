@@ -1,134 +1,306 @@
-import redis
+import redis.asyncio as redis
 import os
 import asyncio
 import json
 import logging
 
-from rooms.models import Match, Room
+from functools import wraps
+from rooms.models import Match, Room, roomTypes
+from rooms.bracket import refresh_bracket
 from asgiref.sync import sync_to_async
 from players.models import Player, MatchPlayer
 from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Mod
+from django.utils import timezone
+from typing import NamedTuple
+from .dispatcher import MatchDispatcher
+from .instrumentation import QueryCounter
+from .queues import ReliableListQueue
+from .streams import PartitionedStreamQueue
+from .presence import PresenceWaiters
+from .dedup import EventDeduplicator
+from .metrics import WorkerMetrics
 
 redis_client = redis.Redis(host=os.environ.get("REDIS_HOST", "localhost"), port=int(os.environ.get("REDIS_PORT", 6379)), db=0, decode_responses=True)
 
 logger = logging.getLogger(__name__)
 
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 30
+
+def database_task(func):
+    """
+    Runs `func` with sync_to_async(thread_sensitive=False), on whichever executor
+    thread is free. Each thread keeps its own connection, and outside a request
+    cycle nothing recycles it, so stale or broken connections are dropped before
+    and after every call, like Django does around a request.
+    """
+    @wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(inner, thread_sensitive=False)
+
+class InvalidGameSyncMessage(Exception):
+    """The message can never be processed (malformed or unknown match) and goes straight to the dead-letter queue."""
+
+class GameOverResult(NamedTuple):
+    next_match: object  # Match that just got both players, or None
+    queries: QueryCounter
+
 class OrchestratorListener:
-    def __init__(self):
-        self.queue_name = "game-sync-session-queue"
+    def __init__(self, batch_size=None, block_timeout=None, concurrency=None, mode=None, queue=None, client=None):
+        self.queue_name = settings.GAME_SYNC_QUEUE
+        self.redis = client or redis_client
+        self.batch_size = batch_size or settings.GAME_SYNC_BATCH_SIZE
+        self.block_timeout = block_timeout or settings.GAME_SYNC_BLOCK_TIMEOUT
         self.running_tasks = set()
+        self.sync_tasks = set()
+        self.metrics = WorkerMetrics()
+        self.presence = PresenceWaiters(get_channel_layer())
+        self.queue = queue or self.build_queue(mode or settings.GAME_SYNC_MODE)
+        self.deduplicator = EventDeduplicator(
+            self.redis,
+            f"{self.queue_name}:seen",
+            ttl=settings.GAME_SYNC_DEDUP_TTL,
+            local_size=settings.GAME_SYNC_DEDUP_LOCAL_SIZE,
+        )
+        self.dispatcher = MatchDispatcher(
+            self.handle_message,
+            concurrency or settings.GAME_SYNC_CONCURRENCY,
+            settings.GAME_SYNC_SHARD_QUEUE_SIZE,
+        )
+
+    def build_queue(self, mode):
+        if mode == "stream":
+            return PartitionedStreamQueue(
+                self.redis,
+                self.queue_name,
+                partitions=settings.GAME_SYNC_PARTITIONS,
+                lease_timeout=settings.GAME_SYNC_LEASE_TIMEOUT,
+                visibility_timeout=settings.GAME_SYNC_VISIBILITY_TIMEOUT,
+                max_attempts=settings.GAME_SYNC_MAX_ATTEMPTS,
+            )
+        if mode == "list":
+            return ReliableListQueue(
+                self.redis,
+                self.queue_name,
+                visibility_timeout=settings.GAME_SYNC_VISIBILITY_TIMEOUT,
+                max_attempts=settings.GAME_SYNC_MAX_ATTEMPTS,
+            )
+        raise ValueError(f"Invalid game sync mode: {mode}")
+
+    @database_task
+    def finish_match(self, match_id, data):
+        """
+        Applies a game-over event as one transaction with a fixed number of statements
+        whatever the roster size: at most 14, the bracket snapshot refresh included
+        (plus the explicit BEGIN on SQLite, and 2 more if the room has no bracket row yet).
+        Runs outside the shared sync thread so game-overs of different matches hit the
+        database in parallel; the row lock on the next match serializes the two games
+        that feed it.
+        """
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries), transaction.atomic():
+            match = Match.objects.select_for_update().filter(id=match_id).first()
+            if match is None:
+                raise InvalidGameSyncMessage(f"Not Found | Match {match_id}")
+            if str(match.status) == "3":
+                logger.warning(f"Warn | {OrchestratorListener.__name__} | game-over | Match {match.id} already finished.")
+                return GameOverResult(None, queries)
+
+            next_match = self.advance_winner(match, data)
+            refresh_bracket(match.room_id)
+            return GameOverResult(next_match, queries)
+
+    def advance_winner(self, match, data):
+        """Records the result and seats the winner in the next match; returns that match once it is filled."""
+        ranks = {p["id"]: p["rank"] for p in data.get("players", [])}
+        if ranks:
+            MatchPlayer.objects.filter(match_id=match.id, player_id__in=ranks).update(
+                position=Case(*(When(player_id=player_id, then=Value(rank)) for player_id, rank in ranks.items()))
+            )
+        Match.objects.filter(id=match.id).update(status=3, winner=data["winner"], updatedAt=timezone.now())
+
+        if match.nextMatch is None:
+            Room.objects.filter(id=match.room_id).update(stage=0)
+            return None
+
+        next_match = Match.objects.select_for_update(of=("self",)).select_related("room").filter(id=match.nextMatch).first()
+        # Both sibling games finishing halve the winner's position: 1,2 -> 1; 3,4 -> 2.
+        new_position = (F("bracketsPosition") + 1) / 2
+        promoted = Player.objects.filter(id=data["winner"]).update(
+            bracketsPosition=new_position,
+            profileColor=1 - Mod(new_position, 2),
+        )
+        if next_match is None or not promoted:
+            return None
+        logger.info(f"UPDATE POSITION Player {data['winner']}, Match {next_match.id}")
 
-    @sync_to_async
-    def increment_stage(self, match):
-        if match.room:
-            match.room.stage = match.stage
-            match.room.save()
-            logger.info(f"INCREMENT STAGE Match {match.id} stage: {match.stage}, Room {match.room.id} stage: {match.room.stage}")
-        else:
-            logger.error(f"Error | {OrchestratorListener.__name__} | increment_stage | Match {match.id} | Room not found.")
-
-    @sync_to_async
-    def update_stage_tournament_ended(self, match):
-        match.room.stage = 0
-        match.room.save()
-
-    @sync_to_async
-    def update_bracket_position(self, player):
-        if player.bracketsPosition % 2 == 0:
-            new_position = player.bracketsPosition // 2
-        else:
-            new_position = (player.bracketsPosition + 1) // 2
-        player.bracketsPosition = new_position
-        if player.bracketsPosition % 2 == 0:
-            player.profileColor = 1
-        else:
-            player.profileColor = 0
-        player.save()
-        logger.info(f"UPDATE POSITION Player {player.id} {player.name}, Position {player.bracketsPosition}")
+        MatchPlayer.objects.bulk_create([MatchPlayer(match=next_match, player_id=data["winner"])], ignore_conflicts=True)
+        if MatchPlayer.objects.filter(match=next_match).count() != 2:
+            return None
+
+        next_match.status = 1
+        Match.objects.filter(id=next_match.id).update(status=1, updatedAt=timezone.now())
+        Room.objects.filter(id=next_match.room_id).update(stage=next_match.stage)
+        next_match.room.stage = next_match.stage
+        logger.info(f"INCREMENT STAGE Match {next_match.id} stage: {next_match.stage}, Room {next_match.room_id} stage: {next_match.stage}")
+        return next_match
+
+    @database_task
+    def update_match(self, match_id, **fields):
+        """
+        game-created / game-started. The gameId is not part of the bracket snapshot,
+        but a status change moves the match's players out of the seated list, so
+        tournament snapshots are refreshed after one. A failed refresh fails the
+        event, and its redelivery refreshes again.
+        """
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            updated = Match.objects.filter(id=match_id).update(**fields, updatedAt=timezone.now())
+            if updated and "status" in fields:
+                room_id = Match.objects.filter(id=match_id, room__type=roomTypes.TOURNAMENT.value).values_list("room_id", flat=True).first()
+                if room_id is not None:
+                    refresh_bracket(room_id)
+        return updated, queries
 
     async def process_game_sync(self, message):
         logger.info(f"\033[93mOrchestrator recebeu mensagem {message}\033[0m")
         try:
             data = json.loads(message)
-        except json.JSONDecodeError as e:
-            return logger.error(f"Error | {OrchestratorListener.__name__} | process_game_sync | {e}")
+            match_id = data["matchId"]
+            event_type = data["type"]
+        except (json.JSONDecodeError, TypeError, KeyError) as e:
+            self.metrics.events[("unknown", "malformed")] += 1
+            raise InvalidGameSyncMessage(f"Malformed message | {e}")
 
-        match = await Match.objects.filter(id=data["matchId"]).afirst()
-        if (match is None):
-            return logger.error(f"Warn | {OrchestratorListener.__name__} | Not Found | Match {data['matchId']}")
+        with self.metrics.event(event_type) as event:
+            event_id = self.deduplicator.event_id(data, message)
+            if await self.deduplicator.seen(event_id):
+                event.outcome = "duplicate"
+                return logger.info(f"{OrchestratorListener.__name__} | {event_type} | Match {match_id} | Duplicate event {event_id} dropped.")
 
-        if data["type"] == "game-created":
-            logger.info(f"{OrchestratorListener.__name__} | game-created | Match {match.id} | Game {match.gameId}.")
-            match.gameId = data["gameId"]
+            if event_type == "game-created":
+                logger.info(f"{OrchestratorListener.__name__} | game-created | Match {match_id} | Game {data.get('gameId')}.")
+                updated, queries = await self.update_match(match_id, gameId=data["gameId"])
 
-        if data["type"] == "game-started":
-            logger.info(f"{OrchestratorListener.__name__} | game-started | Match {match.id} | Game {match.gameId}.")
-            match.status = 2
+            elif event_type == "game-started":
+                logger.info(f"{OrchestratorListener.__name__} | game-started | Match {match_id}.")
+                updated, queries = await self.update_match(match_id, status=2)
 
-        if data["type"] == "game-over":
-            logger.info(f"{OrchestratorListener.__name__} | game-over | Match {match.id} | Game {match.gameId}.")
-            players = await sync_to_async(list)(
-                match.players_in_match.select_related("player").all()
-            )
+            elif event_type == "game-over":
+                logger.info(f"{OrchestratorListener.__name__} | game-over | Match {match_id}.")
+                result = await self.finish_match(match_id, data)
+                if result.next_match is not None:
+                    match_players = MatchPlayer.objects.filter(match=result.next_match)
+                    self.spawn(self.send_sync_match_message(get_channel_layer(), result.next_match, match_players), self.sync_tasks)
+                logger.info(f"Finished | {OrchestratorListener.__name__} | game-over | Match {match_id} | {result.queries.count} queries.")
+                updated, queries = True, result.queries
 
-            for player in players:
-                player_data = next((p for p in data["players"] if p["id"] == player.player.id), None)
-                if player_data:
-                    player.position = player_data["rank"]
-                    await sync_to_async(player.save)()
+            else:
+                event.outcome = "unknown"
+                raise InvalidGameSyncMessage(f"Unknown event type | {event_type}")
 
-            match.status = 3
-            match.winner = data["winner"]
+            event.db(queries)
+            if not updated:
+                event.outcome = "not-found"
+                raise InvalidGameSyncMessage(f"Not Found | Match {match_id}")
+            await self.deduplicator.mark(event_id)
 
-            if (match.nextMatch is not None):
-                next_match = await Match.objects.filter(id=match.nextMatch).afirst()
-                winner = await Player.objects.filter(id=match.winner).afirst()
-                if next_match is not None and winner is not None:
-                    await MatchPlayer.objects.acreate(match=next_match, player=winner)
+    async def handle_message(self, delivery):
+        try:
+            await self.process_game_sync(delivery.message)
+        except InvalidGameSyncMessage as e:
+            logger.error(f"Error | {OrchestratorListener.__name__} | process_game_sync | {e}")
+            return await self.queue.dead_letter(delivery, str(e))
+        except Exception as e:
+            logger.exception(f"Error | {OrchestratorListener.__name__} | process_game_sync | {e}")
+            return await self.queue.fail(delivery, f"{type(e).__name__}: {e}")
+        await self.queue.ack(delivery)
 
-                    as_players = await MatchPlayer.objects.filter(match=next_match).acount()
-                    if as_players == 2:
-                        next_match.status = 1
-                        await self.increment_stage(next_match)
-                        channel_layer = get_channel_layer()
+    async def fetch_batch(self):
+        """
+        Blocks on the queue until a message arrives, then claims whatever else is
+        already waiting (up to batch_size) in a single extra round trip.
+        """
+        return await self.queue.fetch(self.batch_size, self.block_timeout)
 
-                        match_players = MatchPlayer.objects.filter(match=next_match).select_related('player')
+    @staticmethod
+    def match_key(message):
+        try:
+            return json.loads(message).get("matchId", "")
+        except (json.JSONDecodeError, AttributeError):
+            return ""
 
-                        asyncio.create_task(self.send_sync_match_message(channel_layer, next_match, match_players))
-                        await next_match.asave()
-                    await self.update_bracket_position(winner)
-            else:
-                await self.update_stage_tournament_ended(match)
+    @staticmethod
+    def spawn(coroutine, tasks):
+        # Keeps a reference until the task finishes so it is not garbage collected mid-flight.
+        task = asyncio.create_task(coroutine)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
 
-            logger.info(f"Finished | {OrchestratorListener.__name__} | game-over | Match {match.id} | Game {match.gameId}.")
+    async def collect_stats(self):
+        try:
+            stats = await self.queue.stats()
+        except redis.RedisError as e:
+            logger.error(f"Error | {OrchestratorListener.__name__} | collect_stats | {e}")
+            stats = {}
+        self.metrics.set_gauges(
+            **stats,
+            dispatcher_backlog=sum(shard.qsize() for shard in self.dispatcher.shards),
+            sync_match_tasks=len(self.sync_tasks),
+            presence_waiters=self.presence.waiting(),
+        )
 
-        await match.asave()
+    async def report_stats(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            await self.collect_stats()
+            logger.info(f"{OrchestratorListener.__name__} | stats", extra=self.metrics.snapshot())
 
     async def listen(self):
+        await self.queue.recover()
+        self.dispatcher.start()
+        self.spawn(self.queue.maintain(), self.running_tasks)
+        self.spawn(self.presence.listen(), self.running_tasks)
+        if settings.GAME_SYNC_STATS_INTERVAL:
+            self.spawn(self.report_stats(settings.GAME_SYNC_STATS_INTERVAL), self.running_tasks)
+        if settings.GAME_SYNC_METRICS_PORT:
+            self.spawn(self.metrics.serve(settings.GAME_SYNC_METRICS_HOST, settings.GAME_SYNC_METRICS_PORT, self.collect_stats), self.running_tasks)
+        delay = RECONNECT_DELAY
         while True:
-            await asyncio.sleep(1)
-            message = {}
-            message = redis_client.lpop(self.queue_name)
-            if message is None:
+            try:
+                messages = await self.fetch_batch()
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.error(f"Error | {OrchestratorListener.__name__} | listen | Redis unavailable, retrying in {delay}s | {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
                 continue
-            await self.process_game_sync(message)
+            delay = RECONNECT_DELAY
+            for delivery in messages:
+                await self.dispatcher.submit(self.match_key(delivery.message), delivery)
     
     async def send_sync_match_message(self, channel_layer, next_match, match_players):
         logger.info(f"Starting | {OrchestratorListener.__name__} | {self.send_sync_match_message.__name__}.")
-        while True:
-            logger.info(f"Waiting user enter in the room.")
-            players_connected = await match_players.filter(player__isConnected=True).acount()
-            total_players = await match_players.acount()
-
-            if players_connected == total_players:
-                break
-
-            await asyncio.sleep(5)
-        
-        players_list = [
-            {"id": match_player.player.id}
-            async for match_player in match_players
-        ]
+        player_ids = [match_player.player_id async for match_player in match_players]
+
+        async def connected_ids():
+            return [player_id async for player_id in Player.objects.filter(id__in=player_ids, isConnected=True).values_list("id", flat=True)]
+
+        logger.info(f"Waiting user enter in the room.")
+        all_connected = await self.presence.wait_for(player_ids, connected_ids, settings.GAME_SYNC_PRESENCE_TIMEOUT)
+        if not all_connected:
+            logger.warning(f"Warn | {OrchestratorListener.__name__} | send_sync_match_message | Match {next_match.id} | Players not connected after {settings.GAME_SYNC_PRESENCE_TIMEOUT}s, syncing anyway.")
+
+        players_list = [{"id": player_id} for player_id in player_ids]
 
         await channel_layer.group_send(
             f"room_{next_match.room.code}",
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_GROUP = "player_presence"
+REJOIN_INTERVAL = 3600  # Channel layer groups expire, so the listener re-joins periodically.
+
+class PresenceWaiters:
+    """
+    In-worker registry of coroutines waiting for players to connect.
+
+    `RoomConsumer.connect` announces every connection on the `player_presence`
+    channel layer group; `listen` receives those announcements and wakes whoever
+    waits on that player, so nothing has to poll `Player.isConnected`.
+    """
+    def __init__(self, channel_layer):
+        self.channel_layer = channel_layer
+        self._waiters = {}
+
+    def _register(self, player_id):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(player_id, set()).add(future)
+        return future
+
+    def _unregister(self, player_id, future):
+        waiters = self._waiters.get(player_id)
+        if waiters is None:
+            return
+        waiters.discard(future)
+        if not waiters:
+            del self._waiters[player_id]
+
+    def notify(self, player_id):
+        for future in self._waiters.pop(player_id, ()):
+            if not future.done():
+                future.set_result(True)
+
+    def waiting(self):
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def wait_for(self, player_ids, connected_ids, timeout):
+        """
+        Returns True once every player is connected, False if `timeout` seconds pass first.
+        `connected_ids` is awaited once, after registering, so a connection racing the
+        check is never missed.
+        """
+        futures = {player_id: self._register(player_id) for player_id in player_ids}
+        try:
+            connected = set(await connected_ids())
+            pending = [future for player_id, future in futures.items() if player_id not in connected]
+            if pending:
+                await asyncio.wait_for(asyncio.gather(*pending), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            for player_id, future in futures.items():
+                self._unregister(player_id, future)
+
+    async def listen(self):
+        channel = await self.channel_layer.new_channel()
+        while True:
+            await self.channel_layer.group_add(PRESENCE_GROUP, channel)
+            try:
+                async with asyncio.timeout(REJOIN_INTERVAL):
+                    while True:
+                        event = await self.channel_layer.receive(channel)
+                        if event.get("playerId"):
+                            self.notify(event["playerId"])
+            except TimeoutError:
+                continue
+            except Exception as e:
+                logger.error(f"Error | {PresenceWaiters.__name__} | listen | {e}")
+                await asyncio.sleep(1)
@@ -0,0 +1,234 @@
+import json
+import time
+import asyncio
+import logging
+
+from typing import NamedTuple
+from collections import Counter
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+class Delivery(NamedTuple):
+    """A claimed message plus whatever the queue needs to acknowledge it."""
+    message: str
+    receipt: object
+
+# Registers the first message (already moved by BLMOVE) and moves up to ARGV[1] more
+# from the queue into the processing list, stamping each with a visibility deadline.
+CLAIM_SCRIPT = """
+local claimed = {}
+if ARGV[3] then table.insert(claimed, ARGV[3]) end
+for i = 1, tonumber(ARGV[1]) do
+    local message = redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT')
+    if not message then break end
+    table.insert(claimed, message)
+end
+for _, message in ipairs(claimed) do
+    redis.call('ZADD', KEYS[3], ARGV[2], message)
+    redis.call('HINCRBY', KEYS[4], message, 1)
+end
+return claimed
+"""
+
+# Gives orphans in the processing list a deadline, then moves every message whose
+# deadline passed back to the head of the queue, or to the dead-letter list once it
+# ran out of attempts.
+REAP_SCRIPT = """
+for _, message in ipairs(redis.call('LRANGE', KEYS[2], 0, -1)) do
+    if not redis.call('ZSCORE', KEYS[3], message) then
+        redis.call('ZADD', KEYS[3], ARGV[2], message)
+    end
+end
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[4]))
+local requeued, dead = 0, 0
+for i = #expired, 1, -1 do
+    local message = expired[i]
+    redis.call('LREM', KEYS[2], 1, message)
+    redis.call('ZREM', KEYS[3], message)
+    local attempts = tonumber(redis.call('HGET', KEYS[4], message) or '0')
+    if attempts >= tonumber(ARGV[3]) then
+        redis.call('HDEL', KEYS[4], message)
+        redis.call('RPUSH', KEYS[5], cjson.encode({
+            message = message,
+            error = 'visibility timeout expired',
+            attempts = attempts,
+            failedAt = tonumber(ARGV[5]),
+        }))
+        dead = dead + 1
+    else
+        redis.call('LPUSH', KEYS[1], message)
+        requeued = requeued + 1
+    end
+end
+return {requeued, dead}
+"""
+
+# Moves up to ARGV[1] dead-lettered messages (0 = all) back to the tail of the queue
+# with a fresh attempt budget.
+REPLAY_SCRIPT = """
+local replayed = 0
+local limit = tonumber(ARGV[1])
+while limit <= 0 or replayed < limit do
+    local entry = redis.call('LPOP', KEYS[1])
+    if not entry then break end
+    local ok, decoded = pcall(cjson.decode, entry)
+    local message = entry
+    if ok and type(decoded) == 'table' and decoded.message then
+        message = decoded.message
+    end
+    redis.call('HDEL', KEYS[3], message)
+    redis.call('RPUSH', KEYS[2], message)
+    replayed = replayed + 1
+end
+return replayed
+"""
+
+def message_age(message, now=None):
+    """Seconds since the producer stamped the message (`sentAt`, epoch milliseconds), if it did."""
+    try:
+        sent_at = json.loads(message)["sentAt"]
+        return max((now or time.time()) - float(sent_at) / 1000, 0)
+    except (TypeError, ValueError, KeyError):
+        return None
+
+def dead_letter_envelope(message, error, attempts=None):
+    return json.dumps({
+        "message": message,
+        "error": error,
+        "attempts": attempts,
+        "failedAt": time.time(),
+    })
+
+class ReliableListQueue:
+    """
+    At-least-once consumer over a Redis list.
+
+    Claimed messages are moved atomically into `<queue>:processing` and tracked
+    with a visibility deadline in `<queue>:deadlines`. A message only leaves the
+    processing list when it is acknowledged or dead-lettered; anything left behind
+    by a crash is pushed back to the queue by `reap` once its deadline passes.
+    While the worker lives, `maintain` keeps extending the deadlines of the
+    messages it still holds, however long their handlers take. After
+    `max_attempts` deliveries a message goes to `<queue>:dead`, wrapped with the
+    failure reason, where `replay_dead_letters` can pick it up again.
+
+    The processing list is shared and `recover` requeues everything in it, so only
+    one worker may consume a queue in this mode; run several in stream mode
+    (PartitionedStreamQueue) instead.
+    """
+    def __init__(self, client, name, visibility_timeout=60, max_attempts=5):
+        self.client = client
+        self.name = name
+        self.processing = f"{name}:processing"
+        self.deadlines = f"{name}:deadlines"
+        self.attempts = f"{name}:attempts"
+        self.dead = f"{name}:dead"
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.held = Counter()
+        self._claim = client.register_script(CLAIM_SCRIPT)
+        self._reap = client.register_script(REAP_SCRIPT)
+        self._replay = client.register_script(REPLAY_SCRIPT)
+
+    async def fetch(self, batch_size, block_timeout):
+        first = await self.client.blmove(self.name, self.processing, block_timeout, "LEFT", "RIGHT")
+        if first is None:
+            return []
+        deadline = time.time() + self.visibility_timeout
+        claimed = await self._claim(
+            keys=[self.name, self.processing, self.deadlines, self.attempts],
+            args=[max(batch_size - 1, 0), deadline, first],
+        )
+        self.held.update(claimed)
+        return [Delivery(message, message) for message in claimed]
+
+    def _done(self, delivery):
+        self.held[delivery.receipt] -= 1
+        if self.held[delivery.receipt] <= 0:
+            del self.held[delivery.receipt]
+
+    async def ack(self, delivery):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.lrem(self.processing, 1, delivery.receipt)
+            pipe.zrem(self.deadlines, delivery.receipt)
+            pipe.hdel(self.attempts, delivery.receipt)
+            await pipe.execute()
+        self._done(delivery)
+
+    async def fail(self, delivery, error):
+        """Leaves the message to be redelivered after its visibility timeout, or dead-letters it."""
+        attempts = int(await self.client.hget(self.attempts, delivery.receipt) or 0)
+        if attempts >= self.max_attempts:
+            return await self.dead_letter(delivery, error, attempts)
+        # No longer extended, so reap hands it back once the current deadline passes.
+        self._done(delivery)
+
+    async def dead_letter(self, delivery, error, attempts=None):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.lrem(self.processing, 1, delivery.receipt)
+            pipe.zrem(self.deadlines, delivery.receipt)
+            pipe.hdel(self.attempts, delivery.receipt)
+            pipe.rpush(self.dead, dead_letter_envelope(delivery.message, error, attempts))
+            await pipe.execute()
+        self._done(delivery)
+        logger.warning(f"{ReliableListQueue.__name__} | dead_letter | {self.dead} | {error}")
+
+    async def recover(self):
+        """A restarted worker owns nothing yet, so whatever is still in flight belongs to a dead run."""
+        while sum(await self.reap(force=True)) > 0:
+            pass
+
+    async def extend(self):
+        """
+        Heartbeat for the messages this worker still holds, queued in the dispatcher
+        or being handled: pushes their deadlines another visibility_timeout out.
+        Messages already reaped are left alone (XX), since someone else may own them now.
+        """
+        if not self.held:
+            return 0
+        deadline = time.time() + self.visibility_timeout
+        return await self.client.zadd(self.deadlines, {receipt: deadline for receipt in self.held}, xx=True, ch=True)
+
+    async def maintain(self):
+        while True:
+            await asyncio.sleep(max(self.visibility_timeout / 2, 1))
+            try:
+                await self.extend()
+                await self.reap()
+            except RedisError as e:
+                logger.error(f"Error | {ReliableListQueue.__name__} | maintain | {e}")
+
+    async def reap(self, limit=500, force=False):
+        """Requeues expired in-flight messages. `force` requeues everything in flight (startup recovery)."""
+        now = time.time()
+        requeued, dead = await self._reap(
+            keys=[self.name, self.processing, self.deadlines, self.attempts, self.dead],
+            args=["+inf" if force else now, now + self.visibility_timeout, self.max_attempts, limit, now],
+        )
+        if requeued or dead:
+            logger.warning(f"{ReliableListQueue.__name__} | reap | {self.name} | requeued {requeued}, dead-lettered {dead}")
+        return requeued, dead
+
+    async def stats(self):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.llen(self.name)
+            pipe.llen(self.processing)
+            pipe.llen(self.dead)
+            pipe.lindex(self.name, 0)
+            depth, in_flight, dead, oldest = await pipe.execute()
+        return {
+            "queue_depth": depth,
+            "in_flight": in_flight,
+            "dead_letters": dead,
+            "oldest_message_age_seconds": message_age(oldest) if oldest else 0,
+        }
+
+    async def replay_dead_letters(self, limit=0):
+        return await self._replay(keys=[self.dead, self.name, self.attempts], args=[limit])
+
+    async def peek_dead_letters(self, limit=10):
+        return await self.client.lrange(self.dead, 0, limit - 1)
+
+    async def dead_letter_count(self):
+        return await self.client.llen(self.dead)
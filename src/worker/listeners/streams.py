@@ -0,0 +1,297 @@
+import os
+import math
+import time
+import socket
+import asyncio
+import logging
+
+from collections import Counter, deque
+from redis.exceptions import RedisError, ResponseError
+from .queues import Delivery, dead_letter_envelope, message_age
+
+logger = logging.getLogger(__name__)
+
+# Moves messages from the routing list and then the producer list into
+# `<prefix>:<partition>` streams, partitioned by matchId. Every router first parks
+# the message it blocked on in the routing list, so running this atomically keeps
+# the producer's order no matter how many workers route at once. Partition streams
+# are derived from the matchId, so this only runs against a standalone Redis.
+ROUTE_SCRIPT = """
+local prefix = ARGV[1]
+local partitions = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local routed = 0
+for _, source in ipairs(KEYS) do
+    while routed < limit do
+        local message = redis.call('LPOP', source)
+        if not message then break end
+        local key = ''
+        local ok, decoded = pcall(cjson.decode, message)
+        if ok and type(decoded) == 'table' and decoded.matchId ~= nil then
+            key = tostring(decoded.matchId)
+        end
+        local hash = 0
+        for i = 1, #key do
+            hash = (hash * 31 + string.byte(key, i)) % 2147483647
+        end
+        redis.call('XADD', prefix .. ':' .. (hash % partitions), '*', 'message', message)
+        routed = routed + 1
+    end
+end
+return routed
+"""
+
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class PartitionedStreamQueue:
+    """
+    Consumer-group mode for running several game_integration workers at once.
+
+    Producers keep pushing to the `GAME_SYNC_QUEUE` list; every worker routes that
+    list into `<queue>:stream:<n>` partitions keyed by matchId, so one match always
+    lives in one partition. Each partition is leased to a single consumer at a time
+    (`<queue>:stream:<n>:owner`), which keeps a match pinned to one worker and its
+    events in order. Workers heartbeat into `<queue>:stream:consumers` and take
+    ceil(partitions / live workers) leases each. When a worker dies its leases
+    expire, another worker picks the partitions up and claims their pending
+    entries with XAUTOCLAIM before reading anything new.
+    """
+    def __init__(self, client, name, partitions=16, group="game-integration", consumer=None,
+                 lease_timeout=15, visibility_timeout=60, max_attempts=5):
+        self.client = client
+        self.name = name
+        self.prefix = f"{name}:stream"
+        self.routing = f"{name}:routing"
+        self.consumers = f"{self.prefix}:consumers"
+        self.dead = f"{name}:dead"
+        self.partitions = partitions
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_timeout = lease_timeout
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.owned = set()
+        self.in_flight = Counter()
+        self.backlog = deque()
+        self._route = client.register_script(ROUTE_SCRIPT)
+        self._renew = client.register_script(RENEW_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    def stream(self, partition):
+        return f"{self.prefix}:{partition}"
+
+    def owner_key(self, stream):
+        return f"{stream}:owner"
+
+    async def fetch(self, batch_size, block_timeout):
+        if self.backlog:
+            # Already counted in `in_flight` when claim_pending queued them.
+            return [self.backlog.popleft() for _ in range(min(batch_size, len(self.backlog)))]
+        if not self.owned:
+            await asyncio.sleep(block_timeout)
+            return []
+        response = await self.client.xreadgroup(
+            self.group,
+            self.consumer,
+            {stream: ">" for stream in self.owned},
+            count=batch_size,
+            block=int(block_timeout * 1000),
+        )
+        deliveries = [
+            Delivery(fields["message"], (stream, entry_id))
+            for stream, entries in response or []
+            for entry_id, fields in entries
+        ]
+        for delivery in deliveries:
+            self.in_flight[delivery.receipt[0]] += 1
+        return deliveries
+
+    def _done(self, delivery, count=1):
+        stream = delivery.receipt[0]
+        self.in_flight[stream] -= count
+        if self.in_flight[stream] <= 0:
+            del self.in_flight[stream]
+
+    def _drop_backlog(self, stream):
+        """Forgets the entries of `stream` queued locally; whoever owns it next claims them again."""
+        dropped = [delivery for delivery in self.backlog if delivery.receipt[0] == stream]
+        if dropped:
+            self.backlog = deque(delivery for delivery in self.backlog if delivery.receipt[0] != stream)
+            self._done(dropped[0], len(dropped))
+
+    async def ack(self, delivery):
+        stream, entry_id = delivery.receipt
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.xack(stream, self.group, entry_id)
+            pipe.xdel(stream, entry_id)
+            await pipe.execute()
+        self._done(delivery)
+
+    async def fail(self, delivery, error):
+        """Leaves the entry pending so `reclaim_idle` redelivers it, or dead-letters it."""
+        stream, entry_id = delivery.receipt
+        pending = await self.client.xpending_range(stream, self.group, entry_id, entry_id, 1)
+        attempts = pending[0]["times_delivered"] if pending else 0
+        if attempts >= self.max_attempts:
+            return await self.dead_letter(delivery, error, attempts)
+        self._done(delivery)
+
+    async def dead_letter(self, delivery, error, attempts=None):
+        stream, entry_id = delivery.receipt
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(self.dead, dead_letter_envelope(delivery.message, error, attempts))
+            pipe.xack(stream, self.group, entry_id)
+            pipe.xdel(stream, entry_id)
+            await pipe.execute()
+        self._done(delivery)
+        logger.warning(f"{PartitionedStreamQueue.__name__} | dead_letter | {self.dead} | {error}")
+
+    async def claim_pending(self, stream, min_idle_time):
+        """
+        Takes over pending entries of `stream` idle for at least `min_idle_time` ms and
+        queues them locally. Queued entries count as in flight, so rebalance keeps the
+        partition until they are handled.
+        """
+        queued = {delivery.receipt for delivery in self.backlog}
+        start_id = "0-0"
+        claimed = 0
+        while True:
+            response = await self.client.xautoclaim(stream, self.group, self.consumer, min_idle_time, start_id, count=100)
+            start_id, entries = response[0], response[1]
+            for entry_id, fields in entries:
+                if fields and (stream, entry_id) not in queued:
+                    self.backlog.append(Delivery(fields["message"], (stream, entry_id)))
+                    self.in_flight[stream] += 1
+                    claimed += 1
+            if start_id in ("0-0", b"0-0"):
+                return claimed
+
+    async def ensure_group(self, stream):
+        try:
+            await self.client.xgroup_create(stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def acquire(self, stream):
+        if not await self.client.set(self.owner_key(stream), self.consumer, nx=True, px=int(self.lease_timeout * 1000)):
+            return False
+        await self.ensure_group(stream)
+        self.owned.add(stream)
+        claimed = await self.claim_pending(stream, 0)
+        logger.info(f"{PartitionedStreamQueue.__name__} | acquire | {self.consumer} owns {stream}, reclaimed {claimed} pending")
+        return True
+
+    async def release(self, stream):
+        self.owned.discard(stream)
+        self._drop_backlog(stream)
+        await self._release(keys=[self.owner_key(stream)], args=[self.consumer])
+        logger.info(f"{PartitionedStreamQueue.__name__} | release | {self.consumer} released {stream}")
+
+    async def rebalance(self):
+        now = time.time()
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.consumers, {self.consumer: now})
+            pipe.zremrangebyscore(self.consumers, "-inf", now - self.lease_timeout)
+            pipe.zcard(self.consumers)
+            _, _, live = await pipe.execute()
+        share = math.ceil(self.partitions / max(live, 1))
+
+        for stream in list(self.owned):
+            if not await self._renew(keys=[self.owner_key(stream)], args=[self.consumer, int(self.lease_timeout * 1000)]):
+                self.owned.discard(stream)
+                self._drop_backlog(stream)
+                logger.warning(f"{PartitionedStreamQueue.__name__} | rebalance | {self.consumer} lost lease on {stream}")
+
+        # Hand back surplus partitions once nothing from them is still being processed here.
+        for stream in list(self.owned):
+            if len(self.owned) <= share:
+                break
+            if not self.in_flight[stream]:
+                await self.release(stream)
+
+        offset = sum(self.consumer.encode()) % self.partitions
+        for i in range(self.partitions):
+            if len(self.owned) >= share:
+                break
+            stream = self.stream((offset + i) % self.partitions)
+            if stream not in self.owned:
+                await self.acquire(stream)
+
+    async def reclaim_idle(self):
+        min_idle_time = int(self.visibility_timeout * 1000)
+        for stream in list(self.owned):
+            await self.claim_pending(stream, min_idle_time)
+
+    async def route(self, block_timeout, limit=500):
+        parked = await self.client.blmove(self.name, self.routing, block_timeout, "LEFT", "RIGHT")
+        if parked is None:
+            return 0
+        routed = 0
+        while True:
+            moved = await self._route(keys=[self.routing, self.name], args=[self.prefix, self.partitions, limit])
+            routed += moved
+            if moved < limit:
+                return routed
+
+    async def stats(self):
+        streams = [self.stream(partition) for partition in range(self.partitions)]
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.llen(self.name)
+            pipe.lindex(self.name, 0)
+            pipe.llen(self.dead)
+            for stream in streams:
+                pipe.xlen(stream)
+                pipe.xrange(stream, count=1)
+            unrouted, head, dead, *per_stream = await pipe.execute()
+
+        now = time.time()
+        # Acked entries are deleted, so the first entry of each partition is its oldest unfinished one.
+        ages = [message_age(head, now) if head else None]
+        ages += [now - int(entries[0][0].split("-")[0]) / 1000 for entries in per_stream[1::2] if entries]
+        ages = [age for age in ages if age is not None]
+        return {
+            "queue_depth": unrouted + sum(per_stream[0::2]),
+            "in_flight": sum(self.in_flight.values()),
+            "dead_letters": dead,
+            "oldest_message_age_seconds": max(ages) if ages else 0,
+            "owned_partitions": len(self.owned),
+        }
+
+    async def recover(self):
+        await self.rebalance()
+
+    async def maintain(self):
+        await asyncio.gather(self._keep_routing(), self._keep_balanced())
+
+    async def _keep_routing(self):
+        while True:
+            try:
+                await self.route(block_timeout=max(self.lease_timeout / 3, 1))
+            except RedisError as e:
+                logger.error(f"Error | {PartitionedStreamQueue.__name__} | route | {e}")
+                await asyncio.sleep(1)
+
+    async def _keep_balanced(self):
+        last_reclaim = time.monotonic()
+        while True:
+            await asyncio.sleep(max(self.lease_timeout / 3, 1))
+            try:
+                await self.rebalance()
+                if time.monotonic() - last_reclaim >= self.visibility_timeout / 2:
+                    await self.reclaim_idle()
+                    last_reclaim = time.monotonic()
+            except RedisError as e:
+                logger.error(f"Error | {PartitionedStreamQueue.__name__} | rebalance | {e}")
@@ -0,0 +1,36 @@
+import asyncio, logging
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from worker.benchmark import run_benchmark
+
+class Command(BaseCommand):
+    help = "Replay generated tournament events through the game integration worker and report its throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=10, help="Tournament rooms to seed.")
+        parser.add_argument("--players", type=int, default=8, help="Players per room (a power of two).")
+        parser.add_argument("--concurrency", type=int, default=None, help="Matches processed in parallel (GAME_SYNC_CONCURRENCY).")
+        parser.add_argument("--batch-size", type=int, default=None, help="Messages fetched per batch (GAME_SYNC_BATCH_SIZE).")
+        parser.add_argument("--mode", choices=["list", "stream"], default="list", help="Queue the worker consumes (GAME_SYNC_MODE).")
+
+    def handle(self, *args, **kwargs):
+        if kwargs["verbosity"] < 2:
+            logging.getLogger("worker.listeners").setLevel(logging.WARNING)
+
+        # Runs against a throwaway test database, an in-memory channel layer and fakeredis, never Redis.
+        old_name = connection.creation.create_test_db(verbosity=kwargs["verbosity"], autoclobber=True)
+        try:
+            with override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}):
+                result = asyncio.run(run_benchmark(kwargs["rooms"], kwargs["players"], kwargs["concurrency"], kwargs["batch_size"], kwargs["mode"]))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=kwargs["verbosity"])
+
+        self.stdout.write(f"{result['mode']} queue | {result['rooms']} rooms x {result['players']} players | {result['events']} events in {result['seconds']:.2f}s | {result['outcomes']}")
+        self.stdout.write(f"throughput: {result['events_per_second']:.1f} events/s")
+        self.stdout.write(f"latency: p50 {result['p50'] * 1000:.2f}ms | p99 {result['p99'] * 1000:.2f}ms")
+        self.stdout.write(f"queries: {result['queries_per_event']:.2f}/event | " + ", ".join(
+            f"{event_type} {queries:.2f} (max {result['max_queries_by_type'][event_type]})"
+            for event_type, queries in result["queries_by_type"].items()
+        ))
@@ -6,8 +6,12 @@ from django.core.management.base import BaseCommand
 class Command(BaseCommand):
     help = "Run <game_integration> to start the game integration worker."
 
-    async def orchetrator(self):
-        game_sync_listener = OrchestratorListener()
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=None, help="Matches processed in parallel (GAME_SYNC_CONCURRENCY).")
+        parser.add_argument("--mode", choices=["list", "stream"], default=None, help="Queue mode (GAME_SYNC_MODE). Use 'stream' to run several workers.")
+
+    async def orchetrator(self, concurrency=None, mode=None):
+        game_sync_listener = OrchestratorListener(concurrency=concurrency, mode=mode)
 
         try:
             await game_sync_listener.listen()
@@ -20,7 +24,7 @@ class Command(BaseCommand):
         logging.info("UsserSession: Starting game integration worker...")
         try:
             loop = asyncio.get_event_loop()
-            loop.create_task(self.orchetrator())
+            loop.create_task(self.orchetrator(kwargs.get("concurrency"), kwargs.get("mode")))
             loop.run_forever()
         except KeyboardInterrupt:
             logging.info("UsserSession: Worker has been stopped.")
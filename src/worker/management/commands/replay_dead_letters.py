@@ -0,0 +1,38 @@
+import asyncio, json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from worker.listeners.orchestrator_listerner import redis_client
+from worker.listeners.queues import ReliableListQueue
+
+BATCH_SIZE = 500
+
+class Command(BaseCommand):
+    help = "Move dead-lettered game-sync events back to the queue so the game integration worker retries them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=0, help="Maximum number of events to replay (default: all).")
+        parser.add_argument("--dry-run", action="store_true", help="Only list the dead-lettered events.")
+
+    async def replay(self, limit, dry_run):
+        queue = ReliableListQueue(redis_client, settings.GAME_SYNC_QUEUE)
+        total = await queue.dead_letter_count()
+        if dry_run:
+            for entry in await queue.peek_dead_letters(limit or total):
+                envelope = json.loads(entry)
+                self.stdout.write(f"{envelope.get('error')} | attempts {envelope.get('attempts')} | {envelope.get('message')}")
+            return 0
+
+        replayed = 0
+        target = min(limit, total) if limit else total
+        while replayed < target:
+            moved = await queue.replay_dead_letters(min(BATCH_SIZE, target - replayed))
+            if moved == 0:
+                break
+            replayed += moved
+        return replayed
+
+    def handle(self, *args, **kwargs):
+        replayed = asyncio.run(self.replay(kwargs["limit"], kwargs["dry_run"]))
+        if not kwargs["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Replayed {replayed} dead-lettered events to {settings.GAME_SYNC_QUEUE}."))
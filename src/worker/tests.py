@@ -0,0 +1,544 @@
+import json
+import time
+import asyncio
+from collections import Counter
+from unittest import mock, skipUnless
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from channels.layers import InMemoryChannelLayer
+from rooms.models import Room, Match, TournamentBracket
+from rooms.bracket import refresh_bracket
+from players.models import Player, MatchPlayer
+from .benchmark import run_benchmark, seed_rooms
+from .listeners.orchestrator_listerner import OrchestratorListener
+from .listeners.queues import ReliableListQueue
+from .listeners.streams import PartitionedStreamQueue
+from .listeners.dispatcher import MatchDispatcher
+from .listeners.presence import PresenceWaiters, PRESENCE_GROUP
+from .listeners.dedup import EventDeduplicator
+from .listeners.instrumentation import QueryCounter
+from .listeners.metrics import WorkerMetrics
+
+try:
+    import fakeredis
+except ImportError:  # requirements-dev.txt
+    fakeredis = None
+
+@skipUnless(fakeredis, "needs fakeredis[lua]")
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class GameSyncBenchmarkTestCase(TransactionTestCase):
+    def assertAppliesEveryEvent(self, result):
+        # 3 matches per room, 3 events per match
+        self.assertEqual(result["events"], 18)
+        self.assertEqual(result["outcomes"], {"acked": 18})
+        self.assertEqual(result["max_queries_by_type"]["game-created"], 1)
+        # The update, the tournament lookup and the bracket refresh (lock, 3 reads, write, BEGIN on SQLite).
+        self.assertLessEqual(result["max_queries_by_type"]["game-started"], 8 if connection.vendor == "sqlite" else 7)
+        # Per event, not on average; SQLite also counts its explicit BEGIN.
+        self.assertLessEqual(result["max_queries_by_type"]["game-over"], 15 if connection.vendor == "sqlite" else 14)
+        self.assertGreater(result["events_per_second"], 0)
+
+    def test_benchmark_applies_every_event(self):
+        self.assertAppliesEveryEvent(asyncio.run(run_benchmark(rooms=2, players=4, concurrency=1)))
+
+    def test_benchmark_in_stream_mode(self):
+        self.assertAppliesEveryEvent(asyncio.run(run_benchmark(rooms=2, players=4, concurrency=1, mode="stream")))
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class UpdateMatchTestCase(TransactionTestCase):
+    def test_game_started_refreshes_the_bracket(self):
+        room = seed_rooms(1, 4)[0]
+        final = Match.objects.get(room=room, stage=2)
+        MatchPlayer.objects.bulk_create([
+            MatchPlayer(match=final, player=player) for player in Player.objects.filter(roomId=room, bracketsPosition__lte=2)
+        ])
+        Match.objects.filter(room=room, stage=1).update(status=3)
+        Match.objects.filter(id=final.id).update(status=1)
+        Room.objects.filter(id=room.id).update(stage=2)
+        refresh_bracket(room.id)
+        self.assertEqual(len(TournamentBracket.objects.get(room=room).snapshot["players"]), 2)
+
+        listener = OrchestratorListener(queue=mock.Mock(), client=mock.Mock())
+        asyncio.run(listener.update_match(final.id, status=2))
+        self.assertEqual(TournamentBracket.objects.get(room=room).snapshot["players"], {})
+
+    def test_game_over_advances_the_winners_through_the_bracket(self):
+        room = seed_rooms(1, 4)[0]
+        first, second = Match.objects.filter(room=room, stage=1).order_by("position")
+        final = Match.objects.get(room=room, stage=2)
+        seeds = {player.bracketsPosition: player for player in Player.objects.filter(roomId=room)}
+        listener = OrchestratorListener(queue=mock.Mock(), client=mock.Mock())
+
+        def game_over(match, winner, loser):
+            data = {"winner": winner.id, "players": [{"id": winner.id, "rank": 1}, {"id": loser.id, "rank": 2}]}
+            return asyncio.run(listener.finish_match(match.id, data)).next_match
+
+        # The first game over seats its winner; the final waits for the sibling game.
+        self.assertIsNone(game_over(first, seeds[2], seeds[1]))
+        winner = Player.objects.get(id=seeds[2].id)
+        self.assertEqual((winner.bracketsPosition, winner.profileColor), (1, 0))
+        self.assertEqual(list(MatchPlayer.objects.filter(match=final).values_list("player_id", flat=True)), [winner.id])
+        self.assertEqual(str(Match.objects.get(id=final.id).status), "0")
+        self.assertEqual(Room.objects.get(id=room.id).stage, 1)
+
+        next_match = game_over(second, seeds[3], seeds[4])
+        self.assertEqual(next_match.id, final.id)
+        winner = Player.objects.get(id=seeds[3].id)
+        self.assertEqual((winner.bracketsPosition, winner.profileColor), (2, 1))
+        self.assertEqual(set(MatchPlayer.objects.filter(match=final).values_list("player_id", flat=True)), {seeds[2].id, seeds[3].id})
+        self.assertEqual(str(Match.objects.get(id=final.id).status), "1")
+        self.assertEqual(Room.objects.get(id=room.id).stage, 2)
+        self.assertEqual(
+            list(MatchPlayer.objects.filter(match=second).order_by("position").values_list("player_id", flat=True)),
+            [seeds[3].id, seeds[4].id],
+        )
+
+        self.assertIsNone(game_over(final, seeds[3], seeds[2]))
+        final.refresh_from_db()
+        self.assertEqual((str(final.status), final.winner), ("3", seeds[3].id))
+        self.assertEqual(Room.objects.get(id=room.id).stage, 0)
+
+    def test_connections_are_recycled_around_each_call(self):
+        listener = OrchestratorListener(queue=mock.Mock(), client=mock.Mock())
+        with mock.patch("worker.listeners.orchestrator_listerner.close_old_connections") as close_old_connections:
+            updated, _ = asyncio.run(listener.update_match("missing", status=2))
+        self.assertEqual(updated, 0)
+        self.assertEqual(close_old_connections.call_count, 2)
+
+@skipUnless(fakeredis, "needs fakeredis[lua]")
+class ReliableListQueueTestCase(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        self.queue = ReliableListQueue(self.redis, "sync", visibility_timeout=0.05, max_attempts=2)
+
+    async def expire(self):
+        await asyncio.sleep(0.06)
+        return await self.queue.reap()
+
+    async def test_claim_and_ack(self):
+        await self.redis.rpush("sync", "a", "b", "c")
+        deliveries = await self.queue.fetch(2, 1)
+        self.assertEqual([delivery.message for delivery in deliveries], ["a", "b"])
+        self.assertEqual(await self.redis.lrange("sync:processing", 0, -1), ["a", "b"])
+
+        await self.queue.ack(deliveries[0])
+        self.assertEqual(await self.redis.lrange("sync:processing", 0, -1), ["b"])
+        self.assertEqual(await self.redis.zrange("sync:deadlines", 0, -1), ["b"])
+        self.assertEqual(await self.redis.hgetall("sync:attempts"), {"b": "1"})
+        self.assertEqual((await self.queue.stats())["queue_depth"], 1)
+
+    async def test_crashed_delivery_is_redelivered_after_its_visibility_timeout(self):
+        await self.redis.rpush("sync", "a", "b")
+        [claimed] = await self.queue.fetch(1, 1)
+        # The worker dies without acking: nothing comes back before the deadline.
+        self.assertEqual(await self.queue.reap(), (0, 0))
+
+        self.assertEqual(await self.expire(), (1, 0))
+        self.assertEqual(await self.redis.lrange("sync", 0, -1), ["a", "b"])
+        [redelivered] = await self.queue.fetch(1, 1)
+        self.assertEqual(redelivered.message, claimed.message)
+        self.assertEqual(await self.redis.hget("sync:attempts", "a"), "2")
+
+    async def test_held_deliveries_are_extended_until_acked(self):
+        await self.redis.rpush("sync", "a", "b")
+        [slow] = await self.queue.fetch(1, 1)
+        self.assertEqual(self.queue.held, {"a": 1})
+
+        # A handler running past the visibility timeout keeps its message.
+        await asyncio.sleep(0.03)
+        self.assertEqual(await self.queue.extend(), 1)
+        await asyncio.sleep(0.03)
+        self.assertEqual(await self.queue.reap(), (0, 0))
+        self.assertEqual(await self.redis.lrange("sync", 0, -1), ["b"])
+
+        await self.queue.ack(slow)
+        self.assertEqual(self.queue.held, {})
+        self.assertEqual(await self.queue.extend(), 0)
+
+    async def test_failed_and_reaped_deliveries_are_not_extended(self):
+        await self.redis.rpush("sync", "a", "b")
+        failed, reaped = await self.queue.fetch(2, 1)
+        await self.queue.fail(failed, "boom")
+        self.assertEqual(self.queue.held, {"b": 1})
+
+        # Reaped while this worker was stalled: the heartbeat must not resurrect its deadline.
+        await self.redis.zadd("sync:deadlines", {"b": 0})
+        self.assertEqual(await self.queue.reap(), (1, 0))
+        self.assertEqual(await self.queue.extend(), 0)
+        self.assertIsNone(await self.redis.zscore("sync:deadlines", "b"))
+        self.assertEqual(await self.expire(), (1, 0))
+
+    async def test_recover_requeues_everything_in_flight(self):
+        await self.redis.rpush("sync", "a", "b")
+        await self.queue.fetch(2, 1)
+        await self.queue.recover()
+        self.assertEqual(await self.redis.lrange("sync", 0, -1), ["a", "b"])
+        self.assertEqual(await self.redis.llen("sync:processing"), 0)
+
+    async def test_failures_past_max_attempts_are_dead_lettered(self):
+        await self.redis.rpush("sync", "a")
+        [first] = await self.queue.fetch(1, 1)
+        await self.queue.fail(first, "boom")
+        self.assertEqual(await self.redis.llen("sync:dead"), 0)
+
+        await self.expire()
+        [second] = await self.queue.fetch(1, 1)
+        await self.queue.fail(second, "boom again")
+
+        [entry] = await self.queue.peek_dead_letters()
+        envelope = json.loads(entry)
+        self.assertEqual((envelope["message"], envelope["error"], envelope["attempts"]), ("a", "boom again", 2))
+        self.assertEqual(await self.redis.llen("sync:processing"), 0)
+        self.assertEqual(await self.redis.zcard("sync:deadlines"), 0)
+
+    async def test_expired_delivery_out_of_attempts_is_dead_lettered(self):
+        await self.redis.rpush("sync", "a")
+        for _ in range(2):
+            await self.queue.fetch(1, 1)
+            requeued, dead = await self.expire()
+        self.assertEqual((requeued, dead), (0, 1))
+        self.assertEqual(json.loads((await self.queue.peek_dead_letters())[0])["error"], "visibility timeout expired")
+
+    async def test_replay_dead_letters(self):
+        await self.redis.rpush("sync", "a", "b")
+        for delivery in await self.queue.fetch(2, 1):
+            await self.queue.dead_letter(delivery, "boom")
+        await self.redis.rpush("sync", "c")
+
+        self.assertEqual(await self.queue.replay_dead_letters(1), 1)
+        self.assertEqual(await self.queue.replay_dead_letters(), 1)
+        self.assertEqual(await self.redis.lrange("sync", 0, -1), ["c", "a", "b"])
+        self.assertEqual(await self.queue.dead_letter_count(), 0)
+        [replayed] = await self.queue.fetch(1, 1)
+        self.assertEqual(await self.redis.hget("sync:attempts", replayed.message), "1")
+
+@skipUnless(fakeredis, "needs fakeredis[lua]")
+class PartitionedStreamQueueTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+
+    def consumer(self, name, **kwargs):
+        client = fakeredis.FakeAsyncRedis(server=self.server, decode_responses=True)
+        return PartitionedStreamQueue(client, "sync", partitions=4, consumer=name, **kwargs)
+
+    @staticmethod
+    def partition(match_id, partitions=4):
+        """ROUTE_SCRIPT's hash."""
+        hash = 0
+        for byte in match_id.encode():
+            hash = (hash * 31 + byte) % 2147483647
+        return hash % partitions
+
+    async def produce(self, queue, matches, events):
+        messages = [json.dumps({"matchId": f"match-{m}", "seq": e}) for e in range(events) for m in range(matches)]
+        await queue.client.rpush("sync", *messages)
+        self.assertEqual(await queue.route(block_timeout=1), len(messages))
+
+    async def drain(self, queue, processed):
+        while deliveries := await queue.fetch(10, 0.01):
+            for delivery in deliveries:
+                message = json.loads(delivery.message)
+                processed.setdefault(message["matchId"], []).append((queue.consumer, message["seq"]))
+                await queue.ack(delivery)
+
+    async def test_route_keeps_each_match_in_one_partition(self):
+        queue = self.consumer("a")
+        await self.produce(queue, matches=6, events=3)
+
+        for partition in range(4):
+            entries = await queue.client.xrange(queue.stream(partition))
+            for _, fields in entries:
+                self.assertEqual(self.partition(json.loads(fields["message"])["matchId"]), partition)
+        self.assertEqual(await queue.client.llen("sync"), 0)
+        self.assertEqual(await queue.client.llen("sync:routing"), 0)
+
+    async def test_leases_are_acquired_and_renewed(self):
+        queue = self.consumer("a", lease_timeout=10)
+        await queue.rebalance()
+        self.assertEqual(queue.owned, {queue.stream(partition) for partition in range(4)})
+        for stream in queue.owned:
+            self.assertEqual(await queue.client.get(queue.owner_key(stream)), "a")
+
+        stream = queue.stream(0)
+        await queue.client.pexpire(queue.owner_key(stream), 100)
+        await queue.rebalance()
+        self.assertGreater(await queue.client.pttl(queue.owner_key(stream)), 100)
+
+        # A lease another consumer took over is dropped on the next renewal.
+        await queue.client.set(queue.owner_key(stream), "b")
+        await queue.rebalance()
+        self.assertNotIn(stream, queue.owned)
+
+    async def test_second_consumer_takes_half_the_partitions_in_order(self):
+        a, b = self.consumer("a"), self.consumer("b")
+        await self.produce(a, matches=8, events=4)
+        processed = {}
+
+        await a.rebalance()
+        for delivery in await a.fetch(1, 0.01):
+            message = json.loads(delivery.message)
+            processed.setdefault(message["matchId"], []).append(("a", message["seq"]))
+            await a.ack(delivery)
+
+        await b.rebalance()
+        self.assertEqual(b.owned, set())
+        await a.rebalance()
+        await b.rebalance()
+        self.assertEqual((len(a.owned), len(b.owned)), (2, 2))
+        self.assertFalse(a.owned & b.owned)
+
+        await self.drain(a, processed)
+        await self.drain(b, processed)
+        self.assertEqual(len(processed), 8)
+        for match_id, events in processed.items():
+            self.assertEqual([seq for _, seq in events], [0, 1, 2, 3], match_id)
+            # After the hand-over a match is only ever served by its partition's owner.
+            owner = a if a.stream(self.partition(match_id)) in a.owned else b
+            self.assertTrue(all(consumer == owner.consumer for consumer, _ in events[1:]), match_id)
+
+    async def test_pending_entries_of_a_dead_consumer_are_reclaimed(self):
+        a, b = self.consumer("a", lease_timeout=0.1), self.consumer("b", lease_timeout=0.1)
+        await self.produce(a, matches=4, events=2)
+        await a.rebalance()
+        lost = sorted(delivery.message for delivery in await a.fetch(10, 0.01))
+        self.assertTrue(lost)
+
+        # `a` dies holding its deliveries; `b` only gets the partitions once the leases expire.
+        await b.rebalance()
+        self.assertEqual(b.owned, set())
+        await asyncio.sleep(0.15)
+        await b.rebalance()
+        self.assertEqual(len(b.owned), 4)
+
+        reclaimed = await b.fetch(len(lost), 0.01)
+        self.assertEqual(sorted(delivery.message for delivery in reclaimed), lost)
+        for delivery in reclaimed:
+            await b.ack(delivery)
+        for stream in b.owned:
+            self.assertEqual((await b.client.xpending(stream, b.group))["pending"], 0)
+
+    async def take_over(self):
+        """`a` dies holding deliveries; `b` takes its partitions and queues their pending entries."""
+        a, b = self.consumer("a"), self.consumer("b")
+        await self.produce(a, matches=8, events=1)
+        await a.rebalance()
+        await a.fetch(10, 0.01)
+        # As if its heartbeat and leases had expired.
+        await a.client.zrem(a.consumers, "a")
+        await a.client.delete(*[a.owner_key(stream) for stream in a.owned])
+        await b.rebalance()
+        return b
+
+    async def test_reclaimed_entries_count_as_in_flight(self):
+        b = await self.take_over()
+        self.assertEqual(len(b.owned), 4)
+        queued = Counter(delivery.receipt[0] for delivery in b.backlog)
+        self.assertEqual(sum(queued.values()), 8)
+        self.assertEqual(b.in_flight, queued)
+
+        # Reclaiming again does not queue or count the same entries twice.
+        await b.reclaim_idle()
+        self.assertEqual(len(b.backlog), 8)
+
+        # With a second live consumer `b` has surplus partitions, but keeps the ones
+        # whose reclaimed entries it has not handled yet.
+        await b.client.zadd(b.consumers, {"c": time.time()})
+        await b.rebalance()
+        self.assertTrue(set(queued) <= b.owned)
+
+        deliveries = await b.fetch(10, 0.01)
+        self.assertEqual(b.in_flight, queued)
+        for delivery in deliveries:
+            await b.ack(delivery)
+        self.assertEqual(b.in_flight, Counter())
+        await b.rebalance()
+        self.assertEqual(len(b.owned), 2)
+
+    async def test_a_lost_lease_drops_its_queued_entries(self):
+        b = await self.take_over()
+        stream = b.backlog[0].receipt[0]
+        await b.client.set(b.owner_key(stream), "c")
+        await b.rebalance()
+
+        self.assertNotIn(stream, b.owned)
+        self.assertFalse([delivery for delivery in b.backlog if delivery.receipt[0] == stream])
+        self.assertEqual(b.in_flight[stream], 0)
+        self.assertEqual(sum(b.in_flight.values()), len(b.backlog))
+
+@skipUnless(fakeredis, "needs fakeredis[lua]")
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class FetchBatchTestCase(SimpleTestCase):
+    async def test_blocks_then_drains_up_to_batch_size(self):
+        client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        listener = OrchestratorListener(batch_size=3, block_timeout=0.05, mode="list", client=client)
+        await client.rpush(listener.queue_name, *[f"event {i}" for i in range(5)])
+
+        self.assertEqual([delivery.message for delivery in await listener.fetch_batch()], ["event 0", "event 1", "event 2"])
+        self.assertEqual([delivery.message for delivery in await listener.fetch_batch()], ["event 3", "event 4"])
+        self.assertEqual(await listener.fetch_batch(), [])
+        self.assertEqual(await client.llen(f"{listener.queue_name}:processing"), 5)
+
+class MatchDispatcherTestCase(SimpleTestCase):
+    async def test_events_of_a_match_keep_their_order(self):
+        handled = []
+
+        async def handler(message):
+            key, seq = message
+            # Later events of other matches finish first; the same match never overtakes itself.
+            await asyncio.sleep(0.001 * (3 - seq))
+            handled.append(message)
+
+        dispatcher = MatchDispatcher(handler, concurrency=3)
+        dispatcher.start()
+        try:
+            for seq in range(3):
+                for key in ("match-a", "match-b", "match-c", "match-d"):
+                    await dispatcher.submit(key, (key, seq))
+            await dispatcher.join()
+        finally:
+            await dispatcher.stop()
+
+        self.assertEqual(len(handled), 12)
+        for key in ("match-a", "match-b", "match-c", "match-d"):
+            self.assertEqual([seq for handled_key, seq in handled if handled_key == key], [0, 1, 2])
+
+    async def test_matches_on_different_shards_run_concurrently(self):
+        dispatcher = MatchDispatcher(None, concurrency=4)
+        keys = {}
+        for i in range(100):
+            keys.setdefault(dispatcher.shard_for(f"match-{i}"), f"match-{i}")
+        self.assertEqual(len(keys), 4)
+        slow, fast = keys[0], keys[1]
+
+        released = asyncio.Event()
+
+        async def handler(key):
+            # The slow match only finishes once the other shard has handled its match.
+            if key == slow:
+                await asyncio.wait_for(released.wait(), 1)
+            else:
+                released.set()
+
+        dispatcher.handler = handler
+        dispatcher.start()
+        try:
+            await dispatcher.submit(slow, slow)
+            await dispatcher.submit(fast, fast)
+            await asyncio.wait_for(dispatcher.join(), 1)
+        finally:
+            await dispatcher.stop()
+        self.assertTrue(released.is_set())
+
+class PresenceWaitersTestCase(SimpleTestCase):
+    def setUp(self):
+        self.channel_layer = InMemoryChannelLayer()
+        self.presence = PresenceWaiters(self.channel_layer)
+
+    @staticmethod
+    def connected(*player_ids):
+        async def connected_ids():
+            return list(player_ids)
+        return connected_ids
+
+    async def test_connected_players_do_not_wait(self):
+        self.assertTrue(await self.presence.wait_for(["p1", "p2"], self.connected("p1", "p2"), 0.01))
+        self.assertEqual(self.presence.waiting(), 0)
+
+    async def test_announced_connection_wakes_the_waiter(self):
+        waiter = asyncio.create_task(self.presence.wait_for(["p1", "p2"], self.connected("p1"), 1))
+        listener = asyncio.create_task(self.presence.listen())
+        try:
+            while not self.channel_layer.groups.get(PRESENCE_GROUP) or not self.presence.waiting():
+                await asyncio.sleep(0)
+            await self.channel_layer.group_send(PRESENCE_GROUP, {"type": "player.connected", "playerId": "p2"})
+            self.assertTrue(await asyncio.wait_for(waiter, 1))
+        finally:
+            listener.cancel()
+        self.assertEqual(self.presence.waiting(), 0)
+
+    async def test_times_out_when_a_player_never_connects(self):
+        waiter = asyncio.create_task(self.presence.wait_for(["p1", "p2"], self.connected("p1"), 0.05))
+        await asyncio.sleep(0)
+        self.presence.notify("someone else")
+        self.assertFalse(await waiter)
+        self.assertEqual(self.presence.waiting(), 0)
+
+@skipUnless(fakeredis, "needs fakeredis[lua]")
+class EventDeduplicatorTestCase(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+    async def test_duplicates_within_the_ttl_are_seen(self):
+        deduplicator = EventDeduplicator(self.redis, "sync:seen", ttl=60)
+        self.assertFalse(await deduplicator.seen("event-1"))
+        await deduplicator.mark("event-1")
+        self.assertTrue(await deduplicator.seen("event-1"))
+        self.assertFalse(await deduplicator.seen("event-2"))
+
+        # A restarted (or another) worker still sees it through Redis.
+        restarted = EventDeduplicator(self.redis, "sync:seen", ttl=60)
+        self.assertTrue(await restarted.seen("event-1"))
+        self.assertLessEqual(await self.redis.ttl("sync:seen:event-1"), 60)
+
+    async def test_events_are_forgotten_after_the_ttl(self):
+        deduplicator = EventDeduplicator(self.redis, "sync:seen", ttl=1)
+        await deduplicator.mark("event-1")
+        await asyncio.sleep(1.05)
+        self.assertFalse(await deduplicator.seen("event-1"))
+
+    async def test_local_window_is_bounded(self):
+        deduplicator = EventDeduplicator(self.redis, "sync:seen", ttl=60, local_size=2)
+        for event_id in ("event-1", "event-2", "event-3"):
+            await deduplicator.mark(event_id)
+        self.assertEqual(list(deduplicator._local), ["event-2", "event-3"])
+
+    async def test_redis_errors_fall_back_to_the_local_window(self):
+        client = mock.AsyncMock()
+        client.exists.side_effect = client.set.side_effect = RedisConnectionError("down")
+        deduplicator = EventDeduplicator(client, "sync:seen", ttl=60)
+        self.assertFalse(await deduplicator.seen("event-1"))
+        await deduplicator.mark("event-1")
+        self.assertTrue(await deduplicator.seen("event-1"))
+
+    def test_event_id_falls_back_to_the_payload_hash(self):
+        message = json.dumps({"type": "game-started", "matchId": "m"})
+        self.assertEqual(EventDeduplicator.event_id({"eventId": "e"}, message), "e")
+        self.assertEqual(EventDeduplicator.event_id({}, message), EventDeduplicator.event_id({}, message))
+        self.assertNotEqual(EventDeduplicator.event_id({}, message), EventDeduplicator.event_id({}, message + " "))
+
+class WorkerMetricsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.metrics = WorkerMetrics()
+        for count in (3, 5):
+            with self.metrics.event("game-over") as event:
+                queries = QueryCounter()
+                queries.count, queries.duration = count, 0.002
+                event.db(queries)
+        with self.assertRaises(ValueError), self.metrics.event("game-started"):
+            raise ValueError("boom")
+        self.metrics.set_gauges(queue_depth=4, oldest_message_age_seconds=None)
+
+    def test_render(self):
+        lines = self.metrics.render().splitlines()
+
+        self.assertIn("game_sync_queue_depth 4", lines)
+        self.assertFalse(any(line.startswith("game_sync_oldest_message_age_seconds") for line in lines))
+        self.assertIn('game_sync_events_total{type="game-over",outcome="ok"} 2', lines)
+        self.assertIn('game_sync_events_total{type="game-started",outcome="error"} 1', lines)
+        self.assertIn('game_sync_db_queries_total{type="game-over"} 8', lines)
+        self.assertIn('game_sync_db_duration_seconds_bucket{type="game-over",le="0.0025"} 2', lines)
+        self.assertIn('game_sync_db_duration_seconds_bucket{type="game-over",le="+Inf"} 2', lines)
+        self.assertIn('game_sync_event_duration_seconds_count{type="game-started"} 1', lines)
+        # Buckets are cumulative.
+        buckets = [int(line.rsplit(" ", 1)[1]) for line in lines if line.startswith('game_sync_event_duration_seconds_bucket{type="game-over"')]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 2)
+
+    def test_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["events"], {"game-over:ok": 2, "game-started:error": 1})
+        self.assertEqual(snapshot["dbTime"]["game-over"]["queries"], 8)
+        self.assertEqual(snapshot["dbTime"]["game-over"]["maxQueries"], 5)
+        self.assertEqual(snapshot["latency"]["game-started"]["count"], 1)